@@ -8,78 +8,2380 @@ Features:
 - Output card data or associated text as keyboard input
 """
 
-import serial
 import json
 import os
+import io
+import re
+import sys
 import time
+import queue
+import struct
+import socket
 import threading
+import bisect
 import argparse
-from datetime import datetime
-try:
-    import pynput.keyboard as keyboard
-    KEYBOARD_AVAILABLE = True
-except ImportError:
-    KEYBOARD_AVAILABLE = False
-    print("Warning: pynput not installed. Keyboard output disabled.")
-    print("Install with: pip install pynput")
+import contextlib
+import socketserver
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from datetime import datetime, timedelta
+
+# pyserial, pynput and sqlite3 are imported where they are first needed so
+# commands that never touch them (list-cards, associate, ...) start quickly
+keyboard = None
+KEYBOARD_AVAILABLE = None  # unknown until keyboard output is first requested
+
+def keyboard_available():
+    """Import pynput on first use and report whether keyboard output works"""
+    global keyboard, KEYBOARD_AVAILABLE
+    if KEYBOARD_AVAILABLE is None:
+        try:
+            import pynput.keyboard as keyboard
+            KEYBOARD_AVAILABLE = True
+        except ImportError:
+            KEYBOARD_AVAILABLE = False
+            print("Warning: pynput not installed. Keyboard output disabled.")
+            print("Install with: pip install pynput")
+    return KEYBOARD_AVAILABLE
+
+# Write state machine states, each waiting for one firmware acknowledgement
+WRITE_ENTERING = 'entering'      # sent START_WRITE, waiting for "Entering write mode"
+WRITE_SENDING = 'sending'        # sent data, waiting for "Data received"
+WRITE_WAIT_CARD = 'wait_card'    # waiting for a card to be presented
+WRITE_WRITING = 'writing'        # card present, waiting for the result line
+WRITE_FINISHING = 'finishing'    # result known, waiting for "Returning to read mode"
+WRITE_DONE = 'done'
+
+WRITE_TIMEOUT_STATUS = {
+    WRITE_ENTERING: 'no_write_mode_ack',
+    WRITE_SENDING: 'no_data_ack',
+    WRITE_WAIT_CARD: 'card_timeout',
+    WRITE_WRITING: 'result_timeout',
+}
+
+# Failures that can leave the board in write mode still holding the payload
+WRITE_CANCEL_STATUSES = set(WRITE_TIMEOUT_STATUS.values()) | {'data_mismatch', 'data_rejected'}
+
+WRITE_STATUS_MESSAGES = {
+    'success': "Write successful!",
+    'auth_failed': "Authentication failed!",
+    'write_failed': "Write operation failed!",
+    'unknown': "Write ended without a result from the Arduino",
+    'reset': "Arduino reset detected! This may indicate power issues or communication problems.",
+    'no_write_mode_ack': "Arduino did not enter write mode",
+    'no_data_ack': "Arduino did not confirm the data",
+    'data_mismatch': "Arduino received different data than was sent",
+    'data_rejected': "Arduino rejected the block data",
+    'card_timeout': "Write timeout: no card presented",
+    'result_timeout': "Write timeout: no result after the card was detected",
+    'not_connected': "Not connected",
+}
+
+# MIFARE Classic 1K layout: 16 sectors of 4 blocks. Block 0 holds the
+# manufacturer data and the last block of every sector is the trailer with
+# the keys, so payloads start at block 2 and skip every fourth block
+CARD_BLOCK_SIZE = 16
+CARD_BLOCKS = 64
+FIRST_PAYLOAD_BLOCK = 2
+PAYLOAD_BLOCKS = [block for block in range(FIRST_PAYLOAD_BLOCK, CARD_BLOCKS) if block % 4 != 3]
+PAYLOAD_CAPACITY = len(PAYLOAD_BLOCKS) * CARD_BLOCK_SIZE
+
+def payload_blocks(data):
+    """Split a payload into (block address, 16 bytes) pairs that skip sector trailers"""
+    raw = data.encode()
+    if len(raw) > PAYLOAD_CAPACITY:
+        raise ValueError(f"Payload is {len(raw)} bytes, card capacity is {PAYLOAD_CAPACITY}")
+    # Always end with a zero byte (unless the card is full) so the reader
+    # stops there even if a longer payload was written before
+    count = min(len(raw) // CARD_BLOCK_SIZE + 1, len(PAYLOAD_BLOCKS))
+    raw = raw.ljust(count * CARD_BLOCK_SIZE, b'\0')
+    return [(PAYLOAD_BLOCKS[i], raw[i * CARD_BLOCK_SIZE:(i + 1) * CARD_BLOCK_SIZE]) for i in range(count)]
+
+# Lines the firmware acts on in write mode instead of taking them as data
+FIRMWARE_COMMANDS = ('PING', 'START_WRITE', 'START_BATCH', 'END_BATCH', 'CANCEL_WRITE', 'CLEAR_CACHE')
+FIRMWARE_COMMAND_PREFIXES = ('HOLDOFF ', 'CACHE ', 'CLEAR_CACHE ', 'BLOCKS ')
+
+def fits_single_line(data):
+    """Return True if the firmware would store a payload sent as one line unchanged"""
+    # The firmware trims each line and splits on \r and \n
+    return (0 < len(data.encode()) < CARD_BLOCK_SIZE and data == data.strip()
+            and '\r' not in data and '\n' not in data
+            and data not in FIRMWARE_COMMANDS and not data.startswith(FIRMWARE_COMMAND_PREFIXES))
+
+def encode_payload(data):
+    """Return the command lines that transfer a payload, and the firmware's expected echo
+
+    Short payloads use the original single-line protocol. Longer ones, and
+    any the firmware would read as a command or trim, are sent as
+    'BLOCKS <n>' followed by one '<block> <hex>' line per block, all in one
+    stream.
+    """
+    if fits_single_line(data):
+        return [data], data
+    blocks = payload_blocks(data)
+    lines = [f"BLOCKS {len(blocks)}"]
+    lines.extend(f"{block} {chunk.hex().upper()}" for block, chunk in blocks)
+    return lines, f"{len(blocks)} blocks"
+
+def truncate_payload(data):
+    """Cut a payload down to what fits on a card"""
+    return data.encode()[:PAYLOAD_CAPACITY].decode(errors='ignore')
+
+# Boot ROM output (ESP32 "ets ..." / "rst:0x...") or our banner mean the board restarted
+RESET_LINE_RE = re.compile(r'^(ets \w{3} |rst:0x)|RFID Reader ready')
+
+def is_reset_line(line):
+    """Return True if a firmware line shows that the board has reset"""
+    return RESET_LINE_RE.search(line) is not None
+
+# START_CARD-<uid>_CARRIED-<data>, matched directly on the raw line bytes
+CARD_LINE_RE = re.compile(rb'START_CARD-(.*?)_CARRIED-(.*)')
+
+def parse_card_line(line):
+    """Parse a START_CARD line into (uid, data), or None if it is malformed"""
+    if isinstance(line, str):
+        line = line.encode()
+    match = CARD_LINE_RE.fullmatch(line.strip())
+    if not match:
+        return None
+    return match.group(1).decode(errors='replace'), match.group(2).decode(errors='replace')
+
+class LineFramer:
+    """Split a serial byte stream into lines using one preallocated buffer
+
+    Serial input is read straight into the buffer (receive) instead of into
+    fresh bytes objects that are then concatenated. Complete lines are cut
+    out of the buffer in one C-level split; only an unfinished tail is moved
+    to the front.
+    """
+
+    def __init__(self, max_line=4096):
+        self.buffer = bytearray(max_line)
+        self.view = memoryview(self.buffer)
+        self.end = 0  # bytes held in the buffer
+
+    def reserve(self):
+        """Return the free space, dropping runaway noise that never terminates"""
+        space = len(self.buffer) - self.end
+        if not space:
+            self.end = 0
+            space = len(self.buffer)
+        return space
+
+    def receive(self, serial_conn):
+        """Read from the port into the buffer, returning the number of bytes read
+
+        Blocks for the first byte (or the port timeout), then takes whatever
+        else the driver has buffered, as far as the buffer has room.
+        """
+        # reserve() may empty a full buffer, so call it before reading self.end
+        space = self.reserve()
+        count = serial_conn.readinto(self.view[self.end:self.end + min(space, serial_conn.in_waiting or 1)])
+        self.end += count
+        waiting = min(serial_conn.in_waiting, len(self.buffer) - self.end) if count else 0
+        if waiting:
+            more = serial_conn.readinto(self.view[self.end:self.end + waiting])
+            self.end += more
+            count += more
+        return count
+
+    def lines(self):
+        """Cut every complete line out of the buffer"""
+        end = self.buffer.rfind(b'\n', 0, self.end)
+        if end < 0:
+            return []
+        # Splitting one copy of the finished region in C beats slicing each
+        # line out by offset in a Python loop
+        lines = bytes(self.view[:end]).split(b'\n')
+        # Keep the unfinished line at the front for the next read
+        rest = self.end - end - 1
+        self.buffer[:rest] = self.buffer[end + 1:self.end]
+        self.end = rest
+        return [line for line in map(bytes.strip, lines) if line]
+
+class ReadDebouncer:
+    """Collapse repeated reads of a card left on the reader into one event
+
+    Keeps a bounded LRU of recently seen cards keyed by reader and UID (and
+    card data when by_data is set). A read within window seconds of the
+    previous sighting of the same key is a repeat; each repeat extends the
+    window, so a card stays one event for as long as it sits on the reader.
+    """
+
+    def __init__(self, window=2.0, by_data=False, max_entries=1024):
+        self.window = window
+        self.by_data = by_data
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> [last_seen, repeats]
+        self.suppressed = 0
+
+    def check(self, uuid, data, source=None, now=None):
+        """Record a read and return how many repeats it is (0 for a new event)"""
+        if now is None:
+            now = time.monotonic()
+        key = (source, uuid, data) if self.by_data else (source, uuid)
+        entry = self.entries.get(key)
+        if entry is not None and now - entry[0] <= self.window:
+            entry[0] = now
+            entry[1] += 1
+            self.entries.move_to_end(key)
+            self.suppressed += 1
+            return entry[1]
+        self.entries[key] = [now, 0]
+        self.entries.move_to_end(key)
+        # Expired entries are dropped lazily; the size bound evicts the least
+        # recently seen card once the cache is full
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return 0
+
+    def still_present(self, now=None):
+        """Return {key: repeats} for cards seen within the window"""
+        if now is None:
+            now = time.monotonic()
+        return {key: repeats for key, (last_seen, repeats) in self.entries.items()
+                if now - last_seen <= self.window}
+
+class KeyboardWorker(threading.Thread):
+    """Background thread that types queued text so card handling never waits on it
+
+    The queue is bounded; when it is full, overflow decides whether the oldest
+    pending text is dropped ('drop-oldest'), the new text is dropped
+    ('drop-newest') or the caller waits for room ('block').
+    """
+
+    OVERFLOW_POLICIES = ('drop-oldest', 'drop-newest', 'block')
+
+    def __init__(self, pre_delay=0.5, key_interval=0.0, max_queue=32, overflow='drop-oldest'):
+        super().__init__(daemon=True)
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.pre_delay = pre_delay
+        self.key_interval = key_interval
+        self.overflow = overflow
+        self.queue = queue.Queue(maxsize=max(1, max_queue))
+        self.stopped = threading.Event()
+        self.typed = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.metrics = None
+        self.error = None  # why typing stopped, if the worker died
+
+    def submit(self, text, source=None):
+        """Queue text for typing, returning False if it was dropped"""
+        item = (text, time.monotonic(), source)
+        if self.overflow == 'block':
+            # Keep checking the worker so a dead one can't block the caller forever
+            while True:
+                if not self.is_alive():
+                    self.dropped += 1
+                    return False
+                try:
+                    self.queue.put(item, timeout=0.5)
+                    break
+                except queue.Full:
+                    pass
+        elif not self.is_alive():
+            self.dropped += 1
+            return False
+        else:
+            while True:
+                try:
+                    self.queue.put_nowait(item)
+                    break
+                except queue.Full:
+                    if self.overflow == 'drop-newest':
+                        self.dropped += 1
+                        return False
+                    try:
+                        self.queue.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        return True
+
+    def depth(self):
+        """Number of texts waiting to be typed"""
+        return self.queue.qsize()
+
+    def stats(self):
+        """Return queue depth and counters"""
+        return {'depth': self.depth(), 'max_depth': self.max_depth,
+                'typed': self.typed, 'dropped': self.dropped}
+
+    def run(self):
+        # One controller for the whole session instead of one per text
+        try:
+            controller = keyboard.Controller()
+        except Exception as e:
+            # No display or no accessibility permission
+            self.error = e
+            print(f"Keyboard output failed: {e}")
+            return
+        while not self.stopped.is_set():
+            try:
+                text, queued_at, source = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if self.metrics is not None:
+                self.metrics.observe('rfidvault_keyboard_queue_wait_seconds', source,
+                                     time.monotonic() - queued_at)
+            # Give the focused window a moment before typing into it
+            if self.stopped.wait(self.pre_delay):
+                break
+            try:
+                if self.key_interval > 0:
+                    for char in text:
+                        controller.type(char)
+                        time.sleep(self.key_interval)
+                else:
+                    controller.type(text)
+                self.typed += 1
+            except Exception as e:
+                print(f"Error typing text: {e}")
+
+    def stop(self):
+        self.stopped.set()
+
+class NDJSONSink:
+    """Event sink writing one compact JSON object per card event
+
+    Writes are buffered and flushed once the oldest unflushed event is
+    flush_latency seconds old, from the event path or a background timer, so
+    bursts cost one write while a lone event still goes out promptly.
+    """
+
+    FIELDS = ('uid', 'data', 'reader', 'timestamp', 'read_count', 'association')
+
+    def __init__(self, stream, flush_latency=0.1):
+        self.stream = stream
+        self.flush_latency = flush_latency
+        self.lock = threading.Lock()
+        self.oldest_unflushed = None
+        self.closed = False
+        self.wakeup = threading.Event()
+        self.flusher = threading.Thread(target=self.flush_loop, daemon=True)
+        self.flusher.start()
+
+    @classmethod
+    def open(cls, path, flush_latency=0.1):
+        """Open a sink on stdout ('-'), a file (appended to) or a FIFO"""
+        if path == '-':
+            stream = os.fdopen(os.dup(sys.stdout.fileno()), 'wb', buffering=65536)
+        else:
+            # Opening a FIFO waits until a reader attaches
+            stream = open(path, 'ab', buffering=65536)
+        return cls(stream, flush_latency)
+
+    def __call__(self, event):
+        line = json.dumps({field: event.get(field) for field in self.FIELDS},
+                          separators=(',', ':')) + '\n'
+        with self.lock:
+            if self.closed:
+                return
+            try:
+                self.stream.write(line.encode())
+                now = time.monotonic()
+                if self.oldest_unflushed is None:
+                    self.oldest_unflushed = now
+                    self.wakeup.set()
+                elif now - self.oldest_unflushed >= self.flush_latency:
+                    self.flush_locked()
+            except (BrokenPipeError, OSError) as e:
+                self.fail(e)
+
+    def flush_locked(self):
+        self.stream.flush()
+        self.oldest_unflushed = None
+
+    def fail(self, error):
+        # The consumer went away; stop writing rather than failing every event
+        self.closed = True
+        print(f"NDJSON output closed: {error}", file=sys.stderr)
+
+    def flush_loop(self):
+        """Flush events that have waited flush_latency without a newer write doing it"""
+        while not self.closed:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            with self.lock:
+                oldest = self.oldest_unflushed
+            if oldest is None:
+                continue
+            delay = oldest + self.flush_latency - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            with self.lock:
+                if self.closed or self.oldest_unflushed is None:
+                    continue
+                try:
+                    self.flush_locked()
+                except (BrokenPipeError, OSError) as e:
+                    self.fail(e)
+
+    def close(self):
+        """Flush what is buffered and close the stream"""
+        with self.lock:
+            if not self.closed:
+                self.closed = True
+                try:
+                    self.stream.flush()
+                    self.stream.close()
+                except (BrokenPipeError, OSError):
+                    pass
+        self.wakeup.set()
+
+class WebhookSink:
+    """Event sink POSTing card events to an HTTP endpoint in batches
+
+    Events are queued without blocking and sent by a background thread as a
+    JSON array once batch_size events are waiting or the oldest has waited
+    batch_latency seconds, over one persistent connection. Failed batches are
+    retried with exponential backoff and then spooled to an NDJSON file, which
+    is drained ahead of new events once the endpoint answers again.
+    """
+
+    def __init__(self, url, batch_size=100, batch_latency=0.5, spool_path="config/webhook_spool.ndjson",
+                 retries=3, timeout=5.0, max_backoff=30.0, max_queue=10000):
+        from urllib.parse import urlsplit
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f"Unsupported webhook URL: {url}")
+        self.url = url
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        self.batch_size = max(1, batch_size)
+        self.batch_latency = batch_latency
+        self.spool_path = spool_path
+        self.retries = retries
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.spool_lock = threading.Lock()
+        self.conn = None
+        self.running = True
+        self.sent = 0
+        self.spooled = 0
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    def __call__(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # The sender is far behind; keep the event on disk instead of waiting
+            self.spool([event])
+
+    def connection(self):
+        """Return the persistent connection, opening it if needed"""
+        if self.conn is None:
+            import http.client
+            connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            self.conn = connection_class(self.host, self.port, timeout=self.timeout)
+        return self.conn
+
+    def post(self, events):
+        """Send one batch; returns True on success, False if it should be retried
+
+        Batches the endpoint rejects outright (4xx other than 429) are dropped.
+        """
+        body = json.dumps(events, separators=(',', ':')).encode()
+        try:
+            conn = self.connection()
+            conn.request('POST', self.path, body=body,
+                         headers={'Content-Type': 'application/json', 'Connection': 'keep-alive'})
+            response = conn.getresponse()
+            response.read()
+        except Exception:
+            # Broken keep-alive connection or endpoint down; reconnect next time
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+            return False
+        if response.will_close:
+            self.conn.close()
+            self.conn = None
+        if 200 <= response.status < 300:
+            self.sent += len(events)
+            return True
+        if 400 <= response.status < 500 and response.status != 429:
+            print(f"Webhook rejected {len(events)} events: HTTP {response.status}")
+            return True
+        return False
+
+    def deliver(self, events):
+        """Send a batch with retries and backoff; returns False if the endpoint stayed down"""
+        backoff = 0.5
+        for attempt in range(self.retries + 1):
+            if self.post(events):
+                return True
+            if attempt < self.retries and self.running:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+        return False
+
+    def spool(self, events):
+        """Append events to the on-disk spool"""
+        with self.spool_lock:
+            with open(self.spool_path, 'a') as f:
+                for event in events:
+                    f.write(json.dumps(event, separators=(',', ':')) + '\n')
+            self.spooled += len(events)
+
+    def drain_spool(self):
+        """Send spooled events in batches; returns False if the endpoint is still down"""
+        with self.spool_lock:
+            if not os.path.exists(self.spool_path):
+                return True
+            with open(self.spool_path, 'r') as f:
+                lines = f.readlines()
+        events = []
+        for line in lines:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                # Torn line from a crash mid-append
+                pass
+        sent = 0
+        while sent < len(events):
+            if not self.post(events[sent:sent + self.batch_size]):
+                break
+            sent += self.batch_size
+        with self.spool_lock:
+            # Events spooled meanwhile (queue overflow) are kept after the unsent ones
+            with open(self.spool_path, 'r') as f:
+                appended = f.readlines()[len(lines):]
+            remaining = [json.dumps(event, separators=(',', ':')) + '\n' for event in events[sent:]] + appended
+            if remaining:
+                temp_path = self.spool_path + ".tmp"
+                with open(temp_path, 'w') as f:
+                    f.writelines(remaining)
+                os.replace(temp_path, self.spool_path)
+            else:
+                os.remove(self.spool_path)
+        return sent >= len(events)
+
+    def next_batch(self):
+        """Wait for events and return a batch once it is full or its deadline passes"""
+        try:
+            batch = [self.queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_latency
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        down_until = 0.0
+        backoff = 0.5
+        while self.running:
+            batch = self.next_batch()
+            if time.monotonic() < down_until:
+                # Endpoint is down; don't stall new events behind retries
+                if batch:
+                    self.spool(batch)
+                continue
+            if not self.drain_spool() or (batch and not self.deliver(batch)):
+                if batch:
+                    self.spool(batch)
+                print(f"Webhook unreachable, spooling events to {self.spool_path}")
+                down_until = time.monotonic() + backoff
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            backoff = 0.5
+
+    def close(self):
+        """Stop the sender, spooling whatever could not be sent yet"""
+        self.running = False
+        self.worker.join(timeout=self.timeout * (self.retries + 2))
+        events = []
+        while True:
+            try:
+                events.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if events and not self.post(events):
+            self.spool(events)
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+class SerialReader(threading.Thread):
+    """Background thread that blocks on the serial port and queues batches of lines
+
+    Batches are queued as (source, lines) so several readers can share one
+    queue; (source, None) is queued when the reader stops.
+    """
+
+    def __init__(self, serial_conn, line_queue, source=None):
+        super().__init__(daemon=True)
+        self.serial_conn = serial_conn
+        self.line_queue = line_queue
+        self.source = source
+        self.framer = LineFramer()
+        self.running = False
+        # Held while reading; pause() takes it to hand the port to someone else
+        self.port_lock = threading.Lock()
+        self.resumed = threading.Event()
+        self.resumed.set()
+
+    def run(self):
+        self.running = True
+        try:
+            while self.running:
+                self.resumed.wait()
+                with self.port_lock:
+                    if not self.resumed.is_set() or not self.running:
+                        continue
+                    received = self.framer.receive(self.serial_conn)
+                if not received:
+                    continue
+                lines = self.framer.lines()
+                if lines:
+                    self.line_queue.put((self.source, lines))
+        except Exception as e:
+            if self.running:
+                print(f"Serial reader error on {self.source}: {e}")
+        finally:
+            self.running = False
+            # Wake up the consumer so it notices the reader has stopped
+            self.line_queue.put((self.source, None))
+
+    def cancel_read(self):
+        """Wake up a blocking read early where pyserial supports it"""
+        cancel = getattr(self.serial_conn, 'cancel_read', None)
+        if cancel:
+            try:
+                cancel()
+            except Exception:
+                pass
+
+    def pause(self):
+        """Stop reading and wait until the port is free for exclusive use"""
+        self.resumed.clear()
+        self.cancel_read()
+        self.port_lock.acquire()
+
+    def resume(self):
+        """Hand the port back to the reader"""
+        self.port_lock.release()
+        self.resumed.set()
+
+    def stop(self, timeout=2):
+        """Ask the reader to stop and wait for it to exit"""
+        self.running = False
+        self.resumed.set()
+        self.cancel_read()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+class ThreadLocalStdout:
+    """Stand-in for sys.stdout that lets one thread capture its own prints
+
+    The daemon uses it so a control request's output goes back to the
+    client while card reads keep printing to the console.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        buffer = getattr(self.local, 'buffer', None)
+        return (buffer or self.stream).write(text)
+
+    def flush(self):
+        buffer = getattr(self.local, 'buffer', None)
+        (buffer or self.stream).flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    @contextlib.contextmanager
+    def capture(self):
+        """Collect everything the current thread prints into a StringIO"""
+        self.local.buffer = io.StringIO()
+        try:
+            yield self.local.buffer
+        finally:
+            self.local.buffer = None
+
+class ControlRequestHandler(socketserver.StreamRequestHandler):
+    """Serve one newline-delimited JSON request from a CLI client"""
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+            response = self.server.tool.handle_control_request(request)
+        except Exception as e:
+            response = {'ok': False, 'output': f"Error: {e}\n"}
+        try:
+            self.wfile.write((json.dumps(response) + '\n').encode())
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped waiting
+            pass
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class ControlServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        """Unix-socket server the daemon uses to accept CLI commands"""
+        daemon_threads = True
+
+        def __init__(self, path, tool):
+            self.tool = tool
+            super().__init__(path, ControlRequestHandler)
+else:
+    ControlServer = None
+
+# Commands a running daemon can execute on behalf of the CLI
+DAEMON_COMMANDS = ['write', 'associate', 'list-cards', 'list-associations',
+                   'delete-card', 'delete-association']
+
+# Commands that only touch the stores and never open a serial port
+OFFLINE_COMMANDS = ['list-cards', 'list-associations', 'migrate-sqlite', 'associate',
+                    'delete-card', 'delete-association']
+
+def send_daemon_request(socket_path, request, timeout=5.0):
+    """Send one request to a running daemon; returns None when none is running"""
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(socket_path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            sock.sendall((json.dumps(request) + '\n').encode())
+            with sock.makefile('rb') as f:
+                response = f.readline()
+    except (ConnectionRefusedError, FileNotFoundError):
+        # Stale socket file from a daemon that is no longer running
+        return None
+    except OSError as e:
+        # The daemon is alive and holds the port, so running directly can't help
+        reason = "no reply in time" if isinstance(e, socket.timeout) else e
+        return {'ok': False, 'output': f"Daemon busy ({reason}), try again later\n"}
+    if not response:
+        return None
+    return json.loads(response)
+
+class Metrics:
+    """Per-port counters and histograms rendered in the Prometheus text format"""
+
+    COUNTERS = {
+        'rfidvault_lines_total': 'Lines received from the reader',
+        'rfidvault_card_events_total': 'Card reads handled (after debouncing)',
+        'rfidvault_repeat_reads_total': 'Reads of a card still on the reader that debouncing suppressed',
+        'rfidvault_parse_failures_total': 'START_CARD lines that could not be parsed',
+        'rfidvault_write_success_total': 'Card writes that succeeded',
+        'rfidvault_write_failures_total': 'Card writes that failed or timed out',
+        'rfidvault_resets_total': 'Board resets seen (boot ROM output or the ready banner)',
+    }
+    HISTOGRAMS = {
+        'rfidvault_handle_seconds': 'Time spent handling a START_CARD line',
+        'rfidvault_save_seconds': 'Time spent persisting card changes',
+        'rfidvault_keyboard_queue_wait_seconds': 'Time keyboard output waited before typing started',
+        'rfidvault_serial_interarrival_seconds': 'Time between serial reads delivering lines',
+    }
+    BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+               0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}    # (name, port) -> value
+        self.histograms = {}  # (name, port) -> [bucket counts..., +Inf count, sum]
+
+    def inc(self, name, port, amount=1):
+        key = (name, port)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, port, value):
+        key = (name, port)
+        index = bisect.bisect_left(self.BUCKETS, value)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(self.BUCKETS) + 1) + [0.0]
+            histogram[index] += 1
+            histogram[-1] += value
+
+    @staticmethod
+    def labels(port, le=None):
+        """Format the label set; metrics not tied to a reader (saves) have no port label"""
+        labels = []
+        if port is not None:
+            port = str(port).replace('\\', '\\\\').replace('"', '\\"')
+            labels.append(f'port="{port}"')
+        if le is not None:
+            labels.append(f'le="{le}"')
+        return '{' + ','.join(labels) + '}' if labels else ''
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: list(value) for key, value in self.histograms.items()}
+        out = []
+        for name, help_text in self.COUNTERS.items():
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} counter")
+            for (metric, port), value in sorted(counters.items(), key=lambda item: str(item[0])):
+                if metric == name:
+                    out.append(f"{name}{self.labels(port)} {value}")
+        for name, help_text in self.HISTOGRAMS.items():
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} histogram")
+            for (metric, port), values in sorted(histograms.items(), key=lambda item: str(item[0])):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.BUCKETS + ('+Inf',), values[:-1]):
+                    cumulative += count
+                    out.append(f"{name}_bucket{self.labels(port, bound)} {cumulative}")
+                out.append(f"{name}_sum{self.labels(port)} {values[-1]}")
+                out.append(f"{name}_count{self.labels(port)} {cumulative}")
+        return "\n".join(out) + "\n"
+
+def start_metrics_server(metrics, host='127.0.0.1', port=9464):
+    """Serve metrics at http://host:port/metrics from a background thread"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Scrapes would otherwise flood the monitor's console
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class EventSubscriberHandler(socketserver.BaseRequestHandler):
+    """Stream card events to one subscriber from its own bounded buffer"""
+
+    def setup(self):
+        self.buffer = queue.Queue(maxsize=self.server.buffer_size)
+        self.closed = False
+        self.dropped = 0
+        self.server.add_subscriber(self)
+
+    def offer(self, line):
+        """Queue an encoded event without ever waiting on a slow subscriber"""
+        try:
+            self.buffer.put_nowait(line)
+            return
+        except queue.Full:
+            pass
+        self.dropped += 1
+        if self.server.slow_policy == 'disconnect':
+            self.close()
+        elif self.server.slow_policy == 'drop-oldest':
+            try:
+                self.buffer.get_nowait()
+                self.buffer.put_nowait(line)
+            except (queue.Empty, queue.Full):
+                pass
+
+    def close(self):
+        self.closed = True
+        try:
+            self.request.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def handle(self):
+        while not self.closed and not self.server.stopping:
+            try:
+                line = self.buffer.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self.request.sendall(line)
+            except OSError:
+                break
+
+    def finish(self):
+        self.server.remove_subscriber(self)
+
+class EventPublisherMixin:
+    """Fan card events out to every connected subscriber as NDJSON lines
+
+    Each subscriber has its own bounded buffer drained by its own thread, so a
+    lagging client only affects itself. When a buffer is full the slow policy
+    drops that client's oldest event ('drop-oldest'), the new one
+    ('drop-newest'), or disconnects it ('disconnect').
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+    SLOW_POLICIES = ('drop-oldest', 'drop-newest', 'disconnect')
+
+    def __init__(self, address, buffer_size=1000, slow_policy='drop-oldest'):
+        if slow_policy not in self.SLOW_POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {slow_policy}")
+        self.buffer_size = max(1, buffer_size)
+        self.slow_policy = slow_policy
+        self.subscribers = set()
+        self.subscribers_lock = threading.Lock()
+        self.stopping = False
+        super().__init__(address, EventSubscriberHandler)
+
+    def add_subscriber(self, handler):
+        with self.subscribers_lock:
+            self.subscribers.add(handler)
+
+    def remove_subscriber(self, handler):
+        with self.subscribers_lock:
+            self.subscribers.discard(handler)
+
+    def __call__(self, event):
+        line = (json.dumps({field: event.get(field) for field in NDJSONSink.FIELDS},
+                           separators=(',', ':')) + '\n').encode()
+        with self.subscribers_lock:
+            subscribers = list(self.subscribers)
+        for handler in subscribers:
+            handler.offer(line)
+
+    def close(self):
+        """Disconnect every subscriber and stop listening"""
+        self.stopping = True
+        with self.subscribers_lock:
+            subscribers = list(self.subscribers)
+        for handler in subscribers:
+            handler.close()
+        self.shutdown()
+        self.server_close()
+        if isinstance(self.server_address, str) and os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+class TCPEventPublisher(EventPublisherMixin, socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """Event publisher on a TCP address (keep it on loopback)"""
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class UnixEventPublisher(EventPublisherMixin, socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        """Event publisher on a Unix domain socket"""
+else:
+    UnixEventPublisher = None
+
+def parse_publish_address(address):
+    """Return ('tcp', (host, port)) for host:port, or ('unix', path) for anything else"""
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit() and os.sep not in host:
+        return 'tcp', (host or '127.0.0.1', int(port))
+    return 'unix', address
+
+def start_event_publisher(address, buffer_size=1000, slow_policy='drop-oldest'):
+    """Listen for subscribers on address and serve them from a background thread"""
+    kind, address = parse_publish_address(address)
+    if kind == 'tcp':
+        server = TCPEventPublisher(address, buffer_size, slow_policy)
+    else:
+        if UnixEventPublisher is None:
+            raise ValueError("Unix domain sockets are not available here; use host:port")
+        if os.path.exists(address):
+            # Left behind by a monitor that didn't shut down cleanly
+            os.remove(address)
+        server = UnixEventPublisher(address, buffer_size, slow_policy)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def subscribe_events(address, output=None):
+    """Connect to a monitor's event publisher and copy events to output until it closes"""
+    output = output or sys.stdout
+    kind, address = parse_publish_address(address)
+    family = socket.AF_INET if kind == 'tcp' else socket.AF_UNIX
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.connect(address)
+        with sock.makefile('r') as f:
+            for line in f:
+                output.write(line)
+                output.flush()
+
+class CardJournal:
+    """Append-only journal of card reads on top of a JSON snapshot
+
+    Every change is appended as one compact record holding the card's full
+    state, so replaying a record twice is harmless. Once the journal grows
+    past the compaction threshold it is rotated and folded into a new
+    snapshot in the background.
+
+    Other processes (a delete-card run while the monitor is up) append to
+    the same journal. follow() hands the records they added to on_records,
+    and compaction follows the journal before rotating it so those records
+    reach the snapshot instead of being rotated away. If another process
+    rotated the journal, the whole store is rebuilt and passed to on_reload.
+    On POSIX, appends and rotation hold a lock on a shared lock file so they
+    can't interleave across processes.
+    """
+
+    def __init__(self, snapshot_path, compact_threshold=10000):
+        self.snapshot_path = snapshot_path
+        self.journal_path = snapshot_path + ".journal"
+        self.rotated_path = snapshot_path + ".journal.old"
+        self.lock_path = snapshot_path + ".lock"
+        self.compact_threshold = compact_threshold
+        self.lock = threading.Lock()
+        self.journal_file = None
+        self.lock_file = None
+        self.records = 0
+        self.compactor = None
+        self.offset = 0  # bytes of the journal already reflected in the cards
+        self.identity = None  # (device, inode) of the journal that offset is into
+        self.own = set()  # offsets of records this process appended past offset
+        self.on_records = None  # callable(records) for records other processes appended
+        self.on_reload = None  # callable(cards) after another process rotated the journal
+
+    @staticmethod
+    def identify(path):
+        """Return (device, inode) for path, or None if it doesn't exist"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_dev, st.st_ino)
+
+    @contextlib.contextmanager
+    def file_lock(self, byte=0, blocking=True):
+        """Hold one byte of the shared lock file, yielding False if it was busy
+
+        Byte 0 guards appends and rotation, byte 1 a whole compaction. These
+        are per-process record locks, so threads are kept apart by self.lock.
+        """
+        try:
+            import fcntl
+        except ImportError:
+            # No record locks on Windows; appends still land whole
+            yield True
+            return
+        if self.lock_file is None:
+            self.lock_file = open(self.lock_path, 'a')
+        mode = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.lockf(self.lock_file, mode, 1, byte)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.lockf(self.lock_file, fcntl.LOCK_UN, 1, byte)
+
+    def load(self):
+        """Rebuild the cards dict from the snapshot plus the journal tail"""
+        with self.lock, self.file_lock():
+            return self.load_locked()
+
+    def load_locked(self):
+        """load() for a caller that holds both locks"""
+        cards = {}
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, 'r') as f:
+                    cards = json.load(f)
+            except:
+                cards = {}
+        # A rotated journal is left behind if we stopped mid-compaction, and
+        # exists while another process is compacting
+        self.replay(self.rotated_path, cards)
+        records, self.offset = self.read_records(self.journal_path)
+        for _, record in records:
+            self.apply_record(cards, record)
+        self.records = len(records)
+        self.identity = self.identify(self.journal_path)
+        self.own.clear()
+        return cards
+
+    def read_records(self, path, start=0):
+        """Return [(offset, record)] for the whole lines of path after start, and where they end"""
+        records = []
+        end = start
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return records, end
+        with f:
+            f.seek(start)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Still being appended, or torn by a crash mid-append
+                    break
+                offset, end = end, end + len(line)
+                if offset in self.own:
+                    # Written by this process, so already in memory
+                    continue
+                try:
+                    records.append((offset, json.loads(line)))
+                except ValueError:
+                    continue
+        return records, end
+
+    @staticmethod
+    def apply_record(cards, record):
+        """Apply one journal record to cards"""
+        if len(record) == 1:
+            cards.pop(record[0], None)
+        else:
+            uuid, data, last_seen, read_count = record
+            cards[uuid] = {'data': data, 'last_seen': last_seen, 'read_count': read_count}
+
+    def replay(self, path, cards):
+        """Apply the records in a journal file to cards, returning how many there were"""
+        records, _ = self.read_records(path)
+        for _, record in records:
+            self.apply_record(cards, record)
+        return len(records)
+
+    def append(self, uuid, info):
+        """Append the current state of a card, or its deletion if info is None"""
+        record = [uuid] if info is None else [uuid, info['data'], info['last_seen'], info['read_count']]
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode()
+        with self.lock, self.file_lock():
+            if self.journal_file is not None:
+                st = os.fstat(self.journal_file.fileno())
+                if (st.st_dev, st.st_ino) != self.identify(self.journal_path):
+                    # Another process rotated the journal; follow() reloads
+                    self.journal_file.close()
+                    self.journal_file = None
+            if self.journal_file is None:
+                self.journal_file = open(self.journal_path, 'ab')
+                if self.identity is None:
+                    # Nothing of this journal has been read yet, so offset 0 is into it
+                    st = os.fstat(self.journal_file.fileno())
+                    self.identity = (st.st_dev, st.st_ino)
+            self.journal_file.write(line)
+            self.journal_file.flush()
+            self.own.add(self.journal_file.tell() - len(line))
+            self.records += 1
+            return self.records >= self.compact_threshold
+
+    def follow(self):
+        """Pass on the records other processes appended since the last look"""
+        with self.lock, self.file_lock():
+            self.follow_locked()
+
+    def follow_locked(self):
+        """follow() for a caller that holds both locks"""
+        identity = self.identify(self.journal_path)
+        if self.identity is not None and identity != self.identity:
+            cards = self.load_locked()
+            if self.on_reload is not None:
+                self.on_reload(cards)
+            return
+        self.identity = identity
+        if identity is None:
+            return
+        records, self.offset = self.read_records(self.journal_path, self.offset)
+        self.own = {offset for offset in self.own if offset >= self.offset}
+        self.records += len(records)
+        if records and self.on_records is not None:
+            self.on_records([record for _, record in records])
+
+    def compact(self, snapshot_source):
+        """Fold the journal into a new snapshot on a background thread"""
+        if self.compactor and self.compactor.is_alive():
+            return
+        self.compactor = threading.Thread(target=self.run_compaction, args=(snapshot_source,), daemon=True)
+        self.compactor.start()
+
+    def run_compaction(self, snapshot_source):
+        """Rotate the journal, then write a snapshot that covers everything in it"""
+        with self.file_lock(1, blocking=False) as compacting:
+            if not compacting:
+                # Another process is compacting; it covers this journal too
+                return
+            with self.lock, self.file_lock():
+                # Pick up other processes' records before they are rotated away
+                self.follow_locked()
+                if os.path.exists(self.rotated_path):
+                    # Finish a previous interrupted compaction first
+                    os.remove(self.rotated_path)
+                if self.journal_file:
+                    self.journal_file.close()
+                    self.journal_file = None
+                if os.path.exists(self.journal_path):
+                    os.replace(self.journal_path, self.rotated_path)
+                self.records = 0
+                self.offset = 0
+                self.identity = None
+                self.own.clear()
+                # Taken under the journal lock, so every record in the rotated
+                # journal is already reflected in this snapshot
+                cards = snapshot_source()
+            try:
+                tmp_path = self.snapshot_path + ".tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump(cards, f, indent=2)
+                os.replace(tmp_path, self.snapshot_path)
+                os.remove(self.rotated_path)
+            except Exception as e:
+                print(f"Error compacting card journal: {e}")
+
+    def close(self):
+        """Wait for a running compaction and close the journal file"""
+        if self.compactor:
+            self.compactor.join(timeout=30)
+            self.compactor = None
+        with self.lock:
+            if self.journal_file:
+                self.journal_file.close()
+                self.journal_file = None
+            if self.lock_file:
+                self.lock_file.close()
+                self.lock_file = None
+
+class JSONStorage:
+    """Card and association storage in the JSON files under config/"""
+
+    # Changes are persisted by rewriting (or journaling) whole stores
+    incremental = False
+
+    def __init__(self, cards_db, associations_db, journal=False, compact_threshold=10000):
+        self.cards_db = cards_db
+        self.associations_db = associations_db
+        self.journal = CardJournal(cards_db, compact_threshold) if journal else None
+
+    def load_json(self, path):
+        """Load a JSON object from path, or an empty dict if it is missing or broken"""
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    return json.load(f)
+            except:
+                return {}
+        return {}
+
+    def load_cards(self):
+        """Load the cards dict, replaying the journal in journal mode"""
+        if self.journal:
+            return self.journal.load()
+        return self.load_json(self.cards_db)
+
+    def save_cards(self, cards):
+        """Rewrite the cards JSON file"""
+        with open(self.cards_db, 'w') as f:
+            json.dump(cards, f, indent=2)
+
+    def load_associations(self):
+        """Load the associations dict"""
+        return self.load_json(self.associations_db)
+
+    def save_associations(self, associations):
+        """Rewrite the associations JSON file"""
+        with open(self.associations_db, 'w') as f:
+            json.dump(associations, f, indent=2)
+
+    def close(self):
+        """Close the journal if one is in use"""
+        if self.journal:
+            self.journal.close()
+
+class SQLiteTable(MutableMapping):
+    """Write-through dict view over one SQLite table keyed by uid"""
+
+    def __init__(self, storage, table):
+        self.storage = storage
+        self.table = table
+
+    def __getitem__(self, uuid):
+        row = self.storage.query_one(f"SELECT * FROM {self.table} WHERE uid = ?", (uuid,))
+        if row is None:
+            raise KeyError(uuid)
+        return self.storage.row_value(self.table, row)
+
+    def __setitem__(self, uuid, value):
+        self.storage.put(self.table, uuid, value)
+
+    def __delitem__(self, uuid):
+        if not self.storage.execute(f"DELETE FROM {self.table} WHERE uid = ?", (uuid,)).rowcount:
+            raise KeyError(uuid)
+
+    def __iter__(self):
+        for (uuid,) in self.storage.query_all(f"SELECT uid FROM {self.table}"):
+            yield uuid
+
+    def __len__(self):
+        return self.storage.query_one(f"SELECT COUNT(*) FROM {self.table}")[0]
+
+    def items(self):
+        # One query instead of a lookup per key
+        for row in self.storage.query_all(f"SELECT * FROM {self.table}"):
+            yield row[0], self.storage.row_value(self.table, row)
+
+class SQLiteStorage:
+    """Card and association storage in an indexed SQLite database
+
+    Nothing is loaded up front; cards and associations are exposed as
+    write-through mappings and each read updates a single row.
+    """
+
+    incremental = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cards (
+            uid TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            last_seen TEXT NOT NULL,
+            read_count INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS cards_last_seen ON cards (last_seen);
+        CREATE INDEX IF NOT EXISTS cards_read_count ON cards (read_count);
+        CREATE TABLE IF NOT EXISTS associations (
+            uid TEXT PRIMARY KEY,
+            text TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path="config/rfid_vault.db"):
+        self.path = path
+        self.lock = threading.Lock()
+        # uid is the primary key, so lookups by uid use its implicit index
+        import sqlite3
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self.returning = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+    def execute(self, sql, params=()):
+        """Run one statement under the connection lock"""
+        with self.lock:
+            return self.conn.execute(sql, params)
+
+    def query_one(self, sql, params=()):
+        """Run a query and return its first row"""
+        with self.lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    def query_all(self, sql, params=()):
+        """Run a query and return all rows"""
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def row_value(self, table, row):
+        """Convert a table row into the value stored under its uid"""
+        if table == 'cards':
+            return {'data': row[1], 'last_seen': row[2], 'read_count': row[3]}
+        return row[1]
+
+    def put(self, table, uuid, value):
+        """Insert or replace the value stored under a uid"""
+        if table == 'cards':
+            self.execute("INSERT OR REPLACE INTO cards (uid, data, last_seen, read_count) VALUES (?, ?, ?, ?)",
+                         (uuid, value['data'], value['last_seen'], value['read_count']))
+        else:
+            self.execute("INSERT OR REPLACE INTO associations (uid, text) VALUES (?, ?)", (uuid, value))
+
+    def load_cards(self):
+        """Return a lazy mapping over the cards table"""
+        return SQLiteTable(self, 'cards')
+
+    def save_cards(self, cards):
+        # Every change is already written through
+        pass
+
+    def load_associations(self):
+        """Return a lazy mapping over the associations table"""
+        return SQLiteTable(self, 'associations')
+
+    def save_associations(self, associations):
+        # Every change is already written through
+        pass
+
+    def record_read(self, uuid, data, timestamp):
+        """Upsert a card read, incrementing its read count in place"""
+        upsert = ("INSERT INTO cards (uid, data, last_seen, read_count) VALUES (?, ?, ?, 1) "
+                  "ON CONFLICT(uid) DO UPDATE SET data = excluded.data, "
+                  "last_seen = excluded.last_seen, read_count = read_count + 1")
+        with self.lock:
+            if self.returning:
+                read_count = self.conn.execute(upsert + " RETURNING read_count", (uuid, data, timestamp)).fetchone()[0]
+            else:
+                self.conn.execute(upsert, (uuid, data, timestamp))
+                read_count = self.conn.execute("SELECT read_count FROM cards WHERE uid = ?", (uuid,)).fetchone()[0]
+        return {'data': data, 'last_seen': timestamp, 'read_count': read_count}
+
+    def import_json(self, cards, associations):
+        """Bulk-load cards and associations from their JSON dicts"""
+        with self.lock:
+            with self.conn:
+                self.conn.execute("BEGIN")
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO cards (uid, data, last_seen, read_count) VALUES (?, ?, ?, ?)",
+                    ((uuid, info.get('data', ''), info.get('last_seen', ''), info.get('read_count', 0))
+                     for uuid, info in cards.items()))
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO associations (uid, text) VALUES (?, ?)",
+                    associations.items())
+
+    def close(self):
+        """Close the database connection"""
+        with self.lock:
+            self.conn.close()
+
+# Binary snapshot format (.rvs): a header, a fixed-width record index sorted
+# by UID key, a string index, and a blob holding the UID keys and every
+# distinct string once. Records are looked up by binary search straight from
+# a memory map, without decoding the rest of the file.
+SNAPSHOT_MAGIC = b'RVS1'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_CARDS = 1
+SNAPSHOT_ASSOCIATIONS = 2
+# magic, version, kind, record count, string count, record index, string index, blob offsets
+SNAPSHOT_HEADER = struct.Struct('<4sHHIIQQQ')
+# key offset, key length, flags, data (or text) string id, read count, last seen
+SNAPSHOT_RECORD = struct.Struct('<IHHIIq')
+# blob offset, length
+SNAPSHOT_STRING = struct.Struct('<II')
+# Record flags
+LAST_SEEN_STRING = 1  # last_seen is a string id, the value was not a naive ISO timestamp
+LAST_SEEN_NONE = 2
+VALUE_NONE = 4
+
+UID_HEX_RE = re.compile(r'[0-9A-F]{2}(?::[0-9A-F]{2})*')
+# Timestamps stay in the naive local time the JSON store uses
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+def encode_uid(uid):
+    """Encode a UID key: raw bytes for the firmware's hex format, text otherwise"""
+    if UID_HEX_RE.fullmatch(uid):
+        return b'\x00' + bytes.fromhex(uid.replace(':', ''))
+    return b'\x01' + uid.encode()
+
+def decode_uid(key):
+    """Inverse of encode_uid"""
+    if key[0] == 0:
+        return key[1:].hex(':').upper()
+    return key[1:].decode()
+
+def encode_timestamp(value):
+    """Return epoch microseconds for a naive ISO timestamp, or None if it wouldn't round-trip"""
+    try:
+        moment = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is not None or moment.isoformat() != value:
+        return None
+    return (moment - EPOCH) // MICROSECOND
+
+def decode_timestamp(micros):
+    """Inverse of encode_timestamp"""
+    return (EPOCH + timedelta(microseconds=micros)).isoformat()
+
+def write_snapshot(path, mapping, kind):
+    """Write a cards or associations mapping to a binary snapshot file"""
+    string_ids = {}
+    strings = []
+
+    def intern(text):
+        string_id = string_ids.get(text)
+        if string_id is None:
+            string_id = string_ids[text] = len(strings)
+            strings.append(text.encode())
+        return string_id
+
+    records = []
+    for uid, value in mapping.items():
+        flags = 0
+        value_id = read_count = last_seen = 0
+        text = value.get('data') if kind == SNAPSHOT_CARDS else value
+        if not isinstance(text, (str, type(None))):
+            raise ValueError(f"Card {uid} has non-text data")
+        if text is None:
+            flags |= VALUE_NONE
+        else:
+            value_id = intern(text)
+        if kind == SNAPSHOT_CARDS:
+            read_count = value.get('read_count', 0)
+            timestamp = value.get('last_seen')
+            if not isinstance(read_count, int) or not isinstance(timestamp, (str, type(None))):
+                raise ValueError(f"Card {uid} has a malformed read_count or last_seen")
+            if timestamp is None:
+                flags |= LAST_SEEN_NONE
+            else:
+                last_seen = encode_timestamp(timestamp)
+                if last_seen is None:
+                    flags |= LAST_SEEN_STRING
+                    last_seen = intern(timestamp)
+        records.append((encode_uid(uid), flags, value_id, read_count, last_seen))
+    records.sort(key=lambda record: record[0])
+
+    blob = bytearray()
+    record_index = bytearray(len(records) * SNAPSHOT_RECORD.size)
+    for i, (key, flags, value_id, read_count, last_seen) in enumerate(records):
+        SNAPSHOT_RECORD.pack_into(record_index, i * SNAPSHOT_RECORD.size,
+                                  len(blob), len(key), flags, value_id, read_count, last_seen)
+        blob += key
+    string_index = bytearray(len(strings) * SNAPSHOT_STRING.size)
+    for i, encoded in enumerate(strings):
+        SNAPSHOT_STRING.pack_into(string_index, i * SNAPSHOT_STRING.size, len(blob), len(encoded))
+        blob += encoded
+
+    records_offset = SNAPSHOT_HEADER.size
+    strings_offset = records_offset + len(record_index)
+    blob_offset = strings_offset + len(string_index)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, kind, len(records), len(strings),
+                                     records_offset, strings_offset, blob_offset))
+        f.write(record_index)
+        f.write(string_index)
+        f.write(blob)
+    os.replace(tmp_path, path)
+
+class SnapshotFile:
+    """Read-only, memory-mapped view of a binary snapshot"""
+
+    def __init__(self, path, data=None):
+        import mmap
+        self.path = path
+        if data is not None:
+            # Contents already read, e.g. by the store watcher
+            self.map = bytes(data)
+        else:
+            with open(path, 'rb') as f:
+                if os.name == 'nt':
+                    # Windows can't replace a file that is mapped, which every save does
+                    self.map = f.read()
+                else:
+                    self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, self.kind, self.count, self.string_count,
+             self.records_offset, self.strings_offset, self.blob_offset) = SNAPSHOT_HEADER.unpack_from(self.map, 0)
+        except struct.error:
+            magic = version = None
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {SNAPSHOT_VERSION} rfidvault snapshot")
+
+    def __len__(self):
+        return self.count
+
+    def record(self, i):
+        return SNAPSHOT_RECORD.unpack_from(self.map, self.records_offset + i * SNAPSHOT_RECORD.size)
+
+    def key(self, i):
+        offset, length = SNAPSHOT_RECORD.unpack_from(self.map, self.records_offset + i * SNAPSHOT_RECORD.size)[:2]
+        start = self.blob_offset + offset
+        return self.map[start:start + length]
+
+    def string(self, string_id):
+        offset, length = SNAPSHOT_STRING.unpack_from(self.map, self.strings_offset + string_id * SNAPSHOT_STRING.size)
+        start = self.blob_offset + offset
+        return self.map[start:start + length].decode()
+
+    def find(self, uid):
+        """Return the record number for uid, or -1"""
+        key = encode_uid(uid)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self.key(low) == key:
+            return low
+        return -1
+
+    def value(self, i):
+        """Decode record i into a card info dict or an association text"""
+        offset, length, flags, value_id, read_count, last_seen = self.record(i)
+        text = None if flags & VALUE_NONE else self.string(value_id)
+        if self.kind != SNAPSHOT_CARDS:
+            return text
+        if flags & LAST_SEEN_NONE:
+            timestamp = None
+        elif flags & LAST_SEEN_STRING:
+            timestamp = self.string(last_seen)
+        else:
+            timestamp = decode_timestamp(last_seen)
+        return {'data': text, 'last_seen': timestamp, 'read_count': read_count}
+
+    def items(self):
+        for i in range(self.count):
+            yield decode_uid(self.key(i)), self.value(i)
+
+    def close(self):
+        if not isinstance(self.map, bytes):
+            self.map.close()
+
+class SnapshotTable(MutableMapping):
+    """Dict view over a snapshot file plus the changes made since it was loaded
+
+    Lookups of unchanged cards go straight to the memory-mapped file, so
+    opening a large store costs no parsing up front.
+    """
+
+    def __init__(self, snapshot=None):
+        self.snapshot = snapshot
+        self.changes = {}
+        self.deleted = set()   # snapshot keys removed since loading
+        self.new_keys = set()  # changed keys the snapshot doesn't have
+
+    def in_snapshot(self, uid):
+        return self.snapshot is not None and self.snapshot.find(uid) >= 0
+
+    def __getitem__(self, uid):
+        if uid in self.changes:
+            return self.changes[uid]
+        if uid not in self.deleted and self.snapshot is not None:
+            i = self.snapshot.find(uid)
+            if i >= 0:
+                return self.snapshot.value(i)
+        raise KeyError(uid)
+
+    def __setitem__(self, uid, value):
+        if uid not in self.changes:
+            if uid in self.deleted:
+                self.deleted.discard(uid)
+            elif not self.in_snapshot(uid):
+                self.new_keys.add(uid)
+        self.changes[uid] = value
+
+    def __delitem__(self, uid):
+        if uid in self.changes:
+            del self.changes[uid]
+            if uid in self.new_keys:
+                self.new_keys.discard(uid)
+            else:
+                self.deleted.add(uid)
+        elif uid not in self.deleted and self.in_snapshot(uid):
+            self.deleted.add(uid)
+        else:
+            raise KeyError(uid)
+
+    def __iter__(self):
+        for uid, _ in self.items():
+            yield uid
+
+    def __len__(self):
+        base = len(self.snapshot) if self.snapshot is not None else 0
+        return base - len(self.deleted) + len(self.new_keys)
+
+    def items(self):
+        # Decode the snapshot in one pass instead of a lookup per key
+        if self.snapshot is not None:
+            for uid, value in self.snapshot.items():
+                if uid in self.deleted:
+                    continue
+                yield uid, self.changes.get(uid, value)
+        for uid in list(self.new_keys):
+            yield uid, self.changes[uid]
+
+    def copy(self):
+        """Return a table over the same snapshot with its own copy of the changes"""
+        table = SnapshotTable(self.snapshot)
+        table.changes = dict(self.changes)
+        table.deleted = set(self.deleted)
+        table.new_keys = set(self.new_keys)
+        return table
+
+    def rebase(self, path, saved=None):
+        """Switch to a snapshot just written from this table, keeping only later changes
+
+        saved is the copy of the table that was written, or None if the
+        table itself was.
+        """
+        # Cards removed since the copy was taken, including ones it added
+        gone = set() if saved is None else {uid for uid in self.deleted | saved.changes.keys() if uid not in self}
+        # The old map is left to be closed once nothing iterates over it
+        self.snapshot = SnapshotFile(path)
+        if saved is None:
+            self.changes = {}
+        else:
+            self.changes = {uid: value for uid, value in self.changes.items() if saved.get(uid) is not value}
+        self.deleted = {uid for uid in gone if self.snapshot.find(uid) >= 0}
+        self.new_keys = {uid for uid in self.changes if self.snapshot.find(uid) < 0}
+
+    def close(self):
+        if self.snapshot is not None:
+            self.snapshot.close()
+
+def open_snapshot_table(path):
+    """Open a snapshot file as a SnapshotTable, or an empty table if it doesn't exist"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return SnapshotTable()
+    return SnapshotTable(SnapshotFile(path))
+
+def convert_store(source, destination):
+    """Convert a cards or associations store between JSON and the binary snapshot format"""
+    if source.endswith('.rvs'):
+        table = open_snapshot_table(source)
+        data = dict(table.items())
+        table.close()
+    else:
+        with open(source, 'r') as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object of UIDs")
+    if destination.endswith('.rvs'):
+        if all(isinstance(value, str) for value in data.values()):
+            kind = SNAPSHOT_ASSOCIATIONS
+        elif all(isinstance(value, dict) for value in data.values()):
+            kind = SNAPSHOT_CARDS
+        else:
+            raise ValueError("values must all be association texts or card objects")
+        write_snapshot(destination, data, kind)
+    else:
+        with open(destination, 'w') as f:
+            json.dump(data, f, indent=2)
+    return len(data)
+
+class BinaryStorage:
+    """Card and association storage in memory-mapped binary snapshots"""
+
+    # Changes are persisted by rewriting whole stores
+    incremental = False
+
+    def __init__(self, cards_db, associations_db):
+        self.cards_db = cards_db
+        self.associations_db = associations_db
+        self.tables = []
+
+    def load_cards(self):
+        """Open the cards snapshot without decoding it"""
+        table = open_snapshot_table(self.cards_db)
+        self.tables.append(table)
+        return table
+
+    def save_cards(self, cards):
+        """Rewrite the cards snapshot"""
+        write_snapshot(self.cards_db, cards, SNAPSHOT_CARDS)
+
+    @staticmethod
+    def parse(path, raw):
+        """Turn a snapshot read by the store watcher into a table"""
+        return SnapshotTable(SnapshotFile(path, raw))
+
+    def load_associations(self):
+        """Open the associations snapshot without decoding it"""
+        table = open_snapshot_table(self.associations_db)
+        self.tables.append(table)
+        return table
+
+    def save_associations(self, associations):
+        """Rewrite the associations snapshot"""
+        write_snapshot(self.associations_db, associations, SNAPSHOT_ASSOCIATIONS)
+
+    def close(self):
+        """Release the memory maps"""
+        for table in self.tables:
+            table.close()
+        self.tables = []
+
+def pack_uid(uid):
+    """Return a compact key for a UID: an int for the firmware's hex format, the string otherwise"""
+    if isinstance(uid, str) and UID_HEX_RE.fullmatch(uid):
+        # The leading 01 byte keeps leading zero bytes, and with them the UID length
+        return int('01' + uid.replace(':', ''), 16)
+    return uid
+
+def unpack_uid(key):
+    """Inverse of pack_uid"""
+    if isinstance(key, int):
+        return bytes.fromhex(format(key, 'x')[1:]).hex(':').upper()
+    return key
+
+def pack_timestamp(value):
+    """Return a naive ISO timestamp as float seconds since the epoch, other values unchanged"""
+    micros = encode_timestamp(value) if isinstance(value, str) else None
+    return value if micros is None else micros / 1e6
+
+def unpack_timestamp(value):
+    """Inverse of pack_timestamp"""
+    if isinstance(value, float):
+        return decode_timestamp(round(value * 1e6))
+    return value
+
+class CardRecord:
+    """One card in a CardTable"""
+
+    __slots__ = ('data', 'last_seen', 'read_count')
+
+    def __init__(self, data, last_seen, read_count):
+        self.data = data
+        self.last_seen = last_seen
+        self.read_count = read_count
+
+class CardTable(MutableMapping):
+    """Compact in-memory cards: int UID keys and slotted records with float timestamps
+
+    Behaves like the cards dict the JSON store loads; reads hand out the
+    same {'data', 'last_seen', 'read_count'} dicts, built on demand.
+    """
+
+    def __init__(self, cards=None):
+        self.records = {}
+        if cards:
+            for uid, info in cards.items():
+                self[uid] = info
+
+    def info(self, record):
+        return {'data': record.data, 'last_seen': unpack_timestamp(record.last_seen),
+                'read_count': record.read_count}
+
+    def __getitem__(self, uid):
+        try:
+            return self.info(self.records[pack_uid(uid)])
+        except KeyError:
+            raise KeyError(uid) from None
+
+    def __setitem__(self, uid, info):
+        self.records[pack_uid(uid)] = CardRecord(info.get('data'), pack_timestamp(info.get('last_seen')),
+                                                 info.get('read_count', 0))
+
+    def __delitem__(self, uid):
+        try:
+            del self.records[pack_uid(uid)]
+        except KeyError:
+            raise KeyError(uid) from None
+
+    def __contains__(self, uid):
+        return pack_uid(uid) in self.records
+
+    def __iter__(self):
+        for key in self.records:
+            yield unpack_uid(key)
+
+    def __len__(self):
+        return len(self.records)
+
+    def items(self):
+        for key, record in self.records.items():
+            yield unpack_uid(key), self.info(record)
+
+class StoreWatcher(threading.Thread):
+    """Background thread that reloads store files changed by other processes
+
+    Uses inotify on Linux and falls back to polling mtimes elsewhere. Each
+    watched path maps to a callback that receives the freshly parsed store
+    (JSON unless another parse function is given); it only runs when the
+    file's content really changed. Writes by this process go through
+    written() so they are not mistaken for outside changes. Followers are
+    called with no data on every event or poll and read their file
+    themselves, for append-only files they only need the new end of.
+    """
+
+    def __init__(self, callbacks, poll_interval=1.0, parse=None, followers=None):
+        super().__init__(daemon=True)
+        import hashlib
+        self.hashlib = hashlib
+        self.followers = followers or {}  # path -> callable()
+        self.callbacks = dict(callbacks, **{path: None for path in self.followers})  # path -> callable(data)
+        self.parse = parse or (lambda path, raw: json.loads(raw))
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.signatures = {path: self.signature(path) for path in self.callbacks}
+        self.digests = {}
+        self.stopped = threading.Event()
+
+    @staticmethod
+    def signature(path):
+        """Return (mtime, size, inode) for path, or None if it doesn't exist"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    @contextlib.contextmanager
+    def written(self, path):
+        """Context manager around a write by this process to a watched file"""
+        with self.lock:
+            yield
+            if path in self.signatures:
+                self.signatures[path] = self.signature(path)
+                self.digests.pop(path, None)
+
+    def check(self, path):
+        """Reload path if it changed since it was last seen"""
+        if path in self.followers:
+            # Asked every time: the file may have been replaced and removed
+            # again by the time we look, leaving the same (missing) signature
+            try:
+                self.followers[path]()
+            except Exception as e:
+                print(f"Error following {path}: {e}")
+            return
+        signature = self.signature(path)
+        if signature is None or signature == self.signatures[path]:
+            return
+        # Read and parse without the lock, so a save (one per tap in plain
+        # JSON mode) never waits for a large store to be parsed
+        error = None
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            data = self.parse(path, raw)
+        except (OSError, ValueError):
+            # Caught mid-write; try again on the next event or poll
+            return
+        except Exception as e:
+            error = e
+        with self.lock:
+            if self.signatures[path] == signature:
+                # A save of ours that written() recorded while we were reading
+                return
+            if self.signature(path) != signature:
+                # Written again since it was read, possibly by a save of ours;
+                # applying this older content would lose that write
+                return
+            self.signatures[path] = signature
+            if error is not None:
+                print(f"Error reloading {path}: {error}")
+                return
+            digest = self.hashlib.sha1(raw).digest()
+            if digest == self.digests.get(path) or not isinstance(data, MutableMapping):
+                return
+            self.digests[path] = digest
+            # Applied under the lock, so a save can't slip in between the
+            # check above and the swap
+            try:
+                self.callbacks[path](data)
+            except Exception as e:
+                print(f"Error reloading {path}: {e}")
+
+    def open_inotify(self):
+        """Return an inotify descriptor watching the stores' directories, or None"""
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            import ctypes
+            import ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init()
+            if fd < 0:
+                return None
+            # IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+            mask = 0x008 | 0x080 | 0x100 | 0x200
+            for directory in {os.path.dirname(os.path.abspath(path)) for path in self.callbacks}:
+                if libc.inotify_add_watch(fd, directory.encode(), mask) < 0:
+                    os.close(fd)
+                    return None
+            return fd
+        except (OSError, AttributeError):
+            return None
+
+    def run(self):
+        fd = self.open_inotify()
+        if fd is None:
+            while not self.stopped.wait(self.poll_interval):
+                for path in self.callbacks:
+                    self.check(path)
+            return
+        import select
+        try:
+            while not self.stopped.is_set():
+                # Any event in the directories triggers a cheap stat of each store
+                if select.select([fd], [], [], self.poll_interval)[0]:
+                    os.read(fd, 65536)
+                    for path in self.callbacks:
+                        self.check(path)
+        finally:
+            os.close(fd)
+
+    def stop(self):
+        self.stopped.set()
 
 class RFIDTool:
-    def __init__(self, port, baudrate=115200):
-        self.port = port
+    def __init__(self, port, baudrate=115200, storage='json', compact_threshold=10000,
+                 sqlite_db=None, compact_cards=False):
+        # Several readers can be serviced at once; the first one is used for
+        # single-reader commands such as write
+        self.ports = list(port) if isinstance(port, (list, tuple)) else [port]
+        self.port = self.ports[0] if self.ports else None
         self.baudrate = baudrate
         self.serial_conn = None
+        self.connections = {}
+        self.firmware_versions = {}
         self.running = False
+        self.readers = []
+        self.line_queue = queue.Queue()
+        self.event_sinks = []
+        self.command_lock = threading.Lock()  # serial commands sent by daemon clients
+        self.store_lock = threading.Lock()  # store changes made by daemon clients
         self.cards_db = "config/rfid_cards.json"
         self.associations_db = "config/rfid_associations.json"
+        self.sqlite_db = "config/rfid_vault.db"
+        if storage == 'sqlite':
+            self.storage = SQLiteStorage(sqlite_db or self.sqlite_db)
+        elif storage == 'binary':
+            self.cards_db = "config/rfid_cards.rvs"
+            self.associations_db = "config/rfid_associations.rvs"
+            self.storage = BinaryStorage(self.cards_db, self.associations_db)
+        else:
+            self.storage = JSONStorage(self.cards_db, self.associations_db,
+                                       journal=(storage == 'journal'),
+                                       compact_threshold=compact_threshold)
+        self.journal = getattr(self.storage, 'journal', None)
+        if self.journal:
+            self.journal.on_records = self.apply_journal_records
+            self.journal.on_reload = self.reload_journal_cards
+        self.compact_cards = compact_cards
         self.cards = self.load_cards()
         self.associations = self.load_associations()
+        self.cards_lock = threading.RLock()
+        self.flush_lock = threading.Lock()
+        self.cards_dirty = 0
+        self.write_behind = False
+        self.flusher = None
+        self.flush_wakeup = threading.Event()
+        self.flush_interval = 5.0
+        self.flush_threshold = 100
+        self.debouncer = None
+        self.report_repeats = False
+        self.pending_uids = set()  # cards changed in memory since the last save
+        self.keyboard_worker = None
+        self.watcher = None
+        self.metrics = None
+        self.metrics_server = None
+        self.last_arrival = {}
         
     def load_cards(self):
-        """Load saved cards from JSON file"""
-        if os.path.exists(self.cards_db):
-            try:
-                with open(self.cards_db, 'r') as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {}
+        """Load saved cards from the storage backend"""
+        cards = self.storage.load_cards()
+        if self.compact_cards and isinstance(cards, dict):
+            # SQLite and binary stores already hand out lazy mappings
+            return CardTable(cards)
+        return cards
     
-    def save_cards(self):
-        """Save cards to JSON file"""
-        with open(self.cards_db, 'w') as f:
-            json.dump(self.cards, f, indent=2)
+    def save_cards(self, cards=None):
+        """Save cards to the storage backend"""
+        if self.storage.incremental:
+            return
+        start = time.perf_counter()
+        with self.store_write(self.cards_db):
+            if cards is None:
+                # Copied inside store_write so a reload can't land between copy and write
+                with self.cards_lock:
+                    cards = self.copy_cards()
+            self.storage.save_cards(cards)
+        with self.cards_lock:
+            # Only now are these changes safe from a reload of an outside edit
+            self.pending_uids = {uuid for uuid in self.pending_uids if cards.get(uuid) != self.cards.get(uuid)}
+            if isinstance(cards, SnapshotTable) and cards.snapshot is getattr(self.cards, 'snapshot', None):
+                # Read unchanged cards from the new file so the overlay stays
+                # small, unless a reload swapped the table meanwhile
+                self.cards.rebase(self.cards_db, cards)
+        if self.metrics is not None:
+            self.metrics.observe('rfidvault_save_seconds', None, time.perf_counter() - start)
     
-    def load_associations(self):
-        """Load UUID-text associations from JSON file"""
-        if os.path.exists(self.associations_db):
+    def store_write(self, path):
+        """Context manager that keeps the store watcher from reloading our own write"""
+        if self.watcher is None:
+            return contextlib.nullcontext()
+        return self.watcher.written(path)
+    
+    def start_store_watcher(self, poll_interval=1.0):
+        """Reload associations (and cards) when another process changes their files"""
+        if self.storage.incremental or self.watcher is not None:
+            # SQLite lookups always see the current rows
+            return
+        callbacks = {self.associations_db: self.reload_associations}
+        followers = {}
+        if self.journal:
+            # Only the journal's new records are read, not the whole store
+            followers[self.journal.journal_path] = self.journal.follow
+        else:
+            callbacks[self.cards_db] = self.reload_cards
+        self.watcher = StoreWatcher(callbacks, poll_interval, self.store_parser(), followers)
+        self.watcher.start()
+    
+    def stop_store_watcher(self):
+        """Stop watching the store files"""
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher.join(timeout=2)
+            self.watcher = None
+    
+    def reload_associations(self, associations):
+        """Swap in associations loaded from disk"""
+        # A single reference swap; readers see either the old or the new dict
+        self.associations = associations
+        print(f"Reloaded associations ({len(associations)})")
+    
+    def store_parser(self):
+        """Return the watcher's parse function, building compact tables while parsing"""
+        parse = getattr(self.storage, 'parse', None) or (lambda path, raw: json.loads(raw))
+        if not self.compact_cards:
+            return parse
+        def parse_store(path, raw):
+            data = parse(path, raw)
+            if path == self.cards_db and isinstance(data, dict):
+                # Converted here, before the watcher takes its lock
+                data = CardTable(data)
+            return data
+        return parse_store
+    
+    def reload_cards(self, cards):
+        """Swap in cards loaded from disk, keeping changes not saved yet"""
+        with self.cards_lock:
+            for uuid in self.pending_uids:
+                if uuid in self.cards:
+                    cards[uuid] = self.cards[uuid]
+                else:
+                    cards.pop(uuid, None)
+            self.cards = cards
+        print(f"Reloaded cards ({len(cards)})")
+    
+    def apply_journal_records(self, records):
+        """Apply card changes another process appended to the journal"""
+        with self.cards_lock:
+            for record in records:
+                CardJournal.apply_record(self.cards, record)
+        print(f"Applied {len(records)} card change(s) from the journal")
+    
+    def reload_journal_cards(self, cards):
+        """Swap in cards rebuilt after another process compacted the journal"""
+        if self.compact_cards:
+            cards = CardTable(cards)
+        with self.cards_lock:
+            self.cards = cards
+        print(f"Reloaded cards ({len(cards)})")
+    
+    def enable_write_behind(self, interval=5.0, threshold=100):
+        """Defer card saves to a background thread that flushes them in batches"""
+        if self.write_behind:
+            return
+        if self.storage.incremental:
+            print("Write-behind is not needed with incremental storage, ignoring")
+            return
+        self.flush_interval = interval
+        self.flush_threshold = max(1, threshold)
+        self.write_behind = True
+        self.flush_wakeup.clear()
+        self.flusher = threading.Thread(target=self.flush_loop, daemon=True)
+        self.flusher.start()
+    
+    def disable_write_behind(self):
+        """Stop the background flusher and write out any pending changes"""
+        if not self.write_behind:
+            return
+        self.write_behind = False
+        self.flush_wakeup.set()
+        if self.flusher:
+            self.flusher.join(timeout=5)
+            self.flusher = None
+        self.flush_cards()
+    
+    def copy_cards(self):
+        """Return a copy of the cards to save; the caller holds cards_lock"""
+        if isinstance(self.cards, SnapshotTable):
+            # Copies only the changes; the snapshot is decoded while saving, outside the lock
+            return self.cards.copy()
+        return dict(self.cards.items())
+    
+    def snapshot_cards(self):
+        """Return a consistent shallow copy of the cards"""
+        with self.cards_lock:
+            return dict(self.cards.items())
+    
+    def record_read(self, uuid, data, timestamp):
+        """Store a card read and return the card's updated info"""
+        if self.storage.incremental:
+            start = time.perf_counter()
+            info = self.storage.record_read(uuid, data, timestamp)
+            if self.metrics is not None:
+                self.metrics.observe('rfidvault_save_seconds', None, time.perf_counter() - start)
+            return info
+        with self.cards_lock:
+            info = {
+                'data': data,
+                'last_seen': timestamp,
+                'read_count': self.cards.get(uuid, {}).get('read_count', 0) + 1
+            }
+            self.cards[uuid] = info
+            self.pending_uids.add(uuid)
+        self.mark_cards_dirty(uuid)
+        return info
+    
+    def mark_cards_dirty(self, uuid=None):
+        """Persist a change to the cards, immediately or via write-behind"""
+        if self.journal and uuid is not None:
+            # Journal mode: one compact append per change, no full rewrite
+            start = time.perf_counter()
+            if self.journal.append(uuid, self.cards.get(uuid)):
+                self.journal.compact(self.snapshot_cards)
+            if self.metrics is not None:
+                self.metrics.observe('rfidvault_save_seconds', None, time.perf_counter() - start)
+            return
+        if not self.write_behind:
+            self.save_cards()
+            return
+        with self.cards_lock:
+            self.cards_dirty += 1
+            dirty = self.cards_dirty
+        if dirty >= self.flush_threshold:
+            self.flush_wakeup.set()
+    
+    def flush_loop(self):
+        """Background loop flushing dirty cards on an interval or threshold"""
+        while self.write_behind:
+            self.flush_wakeup.wait(self.flush_interval)
+            self.flush_wakeup.clear()
+            self.flush_cards()
+    
+    def flush_cards(self):
+        """Write pending card changes to disk if there are any"""
+        # Serialize flushes so an older snapshot never overwrites a newer one
+        with self.flush_lock:
+            with self.cards_lock:
+                if not self.cards_dirty:
+                    return
+                pending = self.cards_dirty
+                self.cards_dirty = 0
             try:
-                with open(self.associations_db, 'r') as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {}
+                self.save_cards()
+            except Exception as e:
+                print(f"Error saving cards: {e}")
+                with self.cards_lock:
+                    self.cards_dirty += pending
+    
+    def load_associations(self):
+        """Load UUID-text associations from the storage backend"""
+        return self.storage.load_associations()
     
     def save_associations(self):
-        """Save UUID-text associations to JSON file"""
-        with open(self.associations_db, 'w') as f:
-            json.dump(self.associations, f, indent=2)
+        """Save UUID-text associations to the storage backend"""
+        with self.store_write(self.associations_db):
+            self.storage.save_associations(self.associations)
+            if isinstance(self.associations, SnapshotTable):
+                self.associations.rebase(self.associations_db)
     
-    def connect(self):
-        """Connect to Arduino via serial"""
+    def connect(self, ready_timeout=5.0):
+        """Connect to every configured Arduino via serial"""
         try:
-            self.serial_conn = serial.Serial(self.port, self.baudrate, timeout=1)
-            time.sleep(2)  # Wait for Arduino to initialize
-            print(f"Connected to {self.port}")
-            return True
-        except Exception as e:
-            print(f"Failed to connect: {e}")
+            import serial
+        except ImportError:
+            print("pyserial not installed. Install with: pip install pyserial")
+            return False
+        for port in self.ports:
+            try:
+                self.connections[port] = serial.Serial(port, self.baudrate, timeout=1)
+            except Exception as e:
+                print(f"Failed to connect to {port}: {e}")
+        if not self.connections:
             return False
+        self.serial_conn = next(iter(self.connections.values()))
+        
+        # Handshake with all boards at once so readers don't add up
+        versions = {}
+        threads = [threading.Thread(target=lambda p=port, c=conn: versions.__setitem__(p, self.wait_ready(c, ready_timeout)))
+                   for port, conn in self.connections.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        for port in self.connections:
+            version = versions.get(port)
+            if version is None:
+                print(f"Connected to {port} (no handshake reply, continuing anyway)")
+            else:
+                print(f"Connected to {port}" + (f" (firmware {version})" if version else ""))
+        self.firmware_versions = versions
+        return True
+    
+    def wait_ready(self, conn, timeout=5.0, ping_interval=0.25):
+        """Wait until the firmware responds, returning its version ('' if unknown) or None on timeout
+
+        Boards that don't reset when the port opens are asked with PING until
+        they answer with PONG and their firmware version. Boards that do
+        announce themselves with the ready banner first and are asked once
+        more; firmware that predates PING never answers, and is given a
+        second before it counts as unversioned.
+        """
+        original_timeout = conn.timeout
+        conn.timeout = ping_interval
+        deadline = time.monotonic() + timeout
+        booted = False
+        pings = 0
+        try:
+            while time.monotonic() < deadline:
+                if not booted:
+                    conn.write(b"PING\n")
+                    pings += 1
+                line = conn.readline().decode(errors='replace').strip()
+                if line.startswith("PONG"):
+                    if pings > 1:
+                        self.drain_replies(conn)
+                    return line[4:].strip()
+                if "RFID Reader ready" in line and not booted:
+                    # PINGs sent while it booted may have been lost
+                    booted = True
+                    conn.write(b"PING\n")
+                    pings += 1
+                    deadline = min(deadline, time.monotonic() + 1.0)
+        except Exception as e:
+            print(f"Handshake error: {e}")
+        finally:
+            conn.timeout = original_timeout
+        return "" if booted else None
+    
+    @staticmethod
+    def drain_replies(conn):
+        """Read until the board goes quiet, dropping replies to the other PINGs sent"""
+        end = time.monotonic() + 1.0
+        while time.monotonic() < end and conn.readline():
+            pass
     
     def disconnect(self):
         """Disconnect from Arduino"""
+        self.stop_metrics()
+        for sink in self.event_sinks:
+            if hasattr(sink, 'close'):
+                sink.close()
+        self.disable_write_behind()
+        self.storage.close()
+        for conn in self.connections.values():
+            if conn.is_open:
+                conn.close()
         if self.serial_conn and self.serial_conn.is_open:
             self.serial_conn.close()
+        if self.connections or self.serial_conn:
             print("Disconnected")
+        self.connections = {}
+        self.serial_conn = None
+    
+    def set_holdoff(self, milliseconds):
+        """Set how long every reader waits before reporting the same card again"""
+        for conn in self.connections.values():
+            conn.write(f"HOLDOFF {int(milliseconds)}\n".encode())
+    
+    def set_card_cache(self, milliseconds):
+        """Set how long every reader reports a card from its cache instead of re-reading it (0 disables)"""
+        for conn in self.connections.values():
+            conn.write(f"CACHE {int(milliseconds)}\n".encode())
+    
+    def clear_card_cache(self, uuid=None, exclude=None):
+        """Drop cached card data on every reader (or just one card's)"""
+        command = f"CLEAR_CACHE {uuid}" if uuid else "CLEAR_CACHE"
+        for conn in self.connections.values():
+            if conn is not exclude and conn.is_open:
+                conn.write((command + "\n").encode())
     
     def send_command(self, command):
         """Send command to Arduino"""
@@ -98,132 +2400,491 @@ class RFIDTool:
                 return ""
         return ""
     
-    def write_to_card(self, data):
+    @contextlib.contextmanager
+    def exclusive_serial(self):
+        """Pause the reader on the main port so a command can talk to the board directly"""
+        paused = [reader for reader in self.readers if reader.serial_conn is self.serial_conn]
+        for reader in paused:
+            reader.pause()
+        try:
+            yield
+        finally:
+            for reader in paused:
+                reader.resume()
+    
+    def start_readers(self):
+        """Start one background reader thread per connected port"""
+        if self.readers:
+            return
+        self.line_queue = queue.Queue()
+        connections = self.connections or {self.port: self.serial_conn}
+        for port, conn in connections.items():
+            reader = SerialReader(conn, self.line_queue, source=port)
+            reader.start()
+            self.readers.append(reader)
+    
+    def stop_readers(self):
+        """Stop all background reader threads"""
+        for reader in self.readers:
+            reader.running = False
+        for reader in self.readers:
+            reader.stop()
+        self.readers = []
+    
+    def write_to_card(self, data, card_timeout=30):
         """Write data to RFID card"""
-        if len(data) > 16:
-            print("Warning: Data truncated to 16 characters")
-            data = data[:16]
+        if len(data.encode()) > PAYLOAD_CAPACITY:
+            print(f"Warning: Data truncated to {PAYLOAD_CAPACITY} bytes")
+            data = truncate_payload(data)
         
-        print("Entering write mode...")
-        self.send_command("START_WRITE")
-        time.sleep(1)  # Increased delay to ensure Arduino is ready
-        
-        print(f"Sending data: {data}")
-        self.send_command(data)
-        time.sleep(0.5)  # Wait for data to be processed
-        
-        print("Present card to write data...")
-        print("Waiting for card...")
+        result = self.run_write(data, card_timeout)
+        print(WRITE_STATUS_MESSAGES.get(result['status'], result['status']))
+        if result['status'] == 'success':
+            print(f"Write took {result['duration']:.2f}s")
+        return result['status'] == 'success'
+    
+    def run_write(self, data, card_timeout=30, ack_timeout=3.0, result_timeout=5.0,
+                  batch=False, verbose=True):
+        """Drive one card write through the firmware's acknowledgements
+
+        Each state waits for a specific firmware line and has its own timeout,
+        so the write takes only as long as the board and the card need.
+        With batch=True a batch session must already be open, and the payload
+        is sent straight away. Returns a dict with the final status, the
+        written card's UID and the time it took.
+        """
+        timeouts = {
+            WRITE_ENTERING: ack_timeout,
+            WRITE_SENDING: ack_timeout,
+            WRITE_WAIT_CARD: card_timeout,
+            WRITE_WRITING: result_timeout,
+            WRITE_FINISHING: ack_timeout,
+        }
+        start_time = time.monotonic()
+        result = {'uid': None, 'data': data, 'status': None, 'duration': 0.0}
         
-        # Clear any existing serial buffer
-        if self.serial_conn and self.serial_conn.in_waiting:
-            self.serial_conn.reset_input_buffer()
+        payload_lines, expected_echo = encode_payload(data)
+        if batch:
+            # The session is already in write mode and waiting for a payload
+            if verbose:
+                print(f"Sending data: {data}")
+            if not self.send_command("\n".join(payload_lines)):
+                result['status'] = 'not_connected'
+                return result
+            state = WRITE_SENDING
+        else:
+            # Drop stale output from before the write so it cannot be taken for an ack
+            if self.serial_conn and self.serial_conn.is_open:
+                self.serial_conn.reset_input_buffer()
+            
+            print("Entering write mode...")
+            if not self.send_command("START_WRITE"):
+                result['status'] = 'not_connected'
+                return result
+            state = WRITE_ENTERING
+        deadline = time.monotonic() + timeouts[state]
+        failure = None
         
-        start_time = time.time()
-        while time.time() - start_time < 30:  # 30 second timeout
+        while state != WRITE_DONE:
+            if time.monotonic() > deadline:
+                if state == WRITE_FINISHING:
+                    # The outcome is already known; the trailing ack is optional
+                    break
+                result['status'] = WRITE_TIMEOUT_STATUS[state]
+                break
             line = self.read_line()
-            if line:
+            if not line:
+                continue
+            if verbose and line != "__WRITE__":
                 print(f"Arduino: {line}")
-                if "Data written successfully" in line:
-                    print("Write successful!")
-                    return True
-                elif "Failed to write" in line:
-                    print("Write failed!")
-                    return False
-                elif "Authentication failed" in line:
-                    print("Authentication failed!")
-                    return False
-                elif "Write operation failed" in line:
-                    print("Write operation failed!")
-                    return False
-                elif "Returning to read mode" in line:
-                    print("Write operation completed, returning to read mode")
-                    return True  # Consider this a success since we got to this point
-                elif "ets" in line or "rst:" in line:
-                    print("Arduino reset detected! This may indicate power issues or communication problems.")
-                    return False
+            
+            if is_reset_line(line):
+                if state != WRITE_ENTERING:
+                    result['status'] = 'reset'
+                    break
+                # Still booting (opening the port resets many boards); ask
+                # again once the firmware announces it is ready
+                if "RFID Reader ready" in line:
+                    self.send_command("START_WRITE")
+                deadline = time.monotonic() + timeouts[state]
+                continue
+            
+            next_state = state
+            if state == WRITE_ENTERING:
+                if line.startswith("Entering write mode"):
+                    print(f"Sending data: {data}")
+                    if len(payload_lines) > 1:
+                        print(f"Payload spans {len(payload_lines) - 1} blocks")
+                    # All blocks go out in one stream; the firmware acknowledges once
+                    self.send_command("\n".join(payload_lines))
+                    next_state = WRITE_SENDING
+            elif state == WRITE_SENDING:
+                if line.startswith("Data received"):
+                    echoed = line.partition("Present card to write:")[2].strip()
+                    if echoed and echoed != expected_echo.strip():
+                        result['status'] = 'data_mismatch'
+                        break
+                    if verbose:
+                        print("Present card to write data...")
+                    next_state = WRITE_WAIT_CARD
+                elif line.startswith("Invalid block data"):
+                    result['status'] = 'data_rejected'
+                    break
+            elif state in (WRITE_WAIT_CARD, WRITE_WRITING):
+                if line.startswith("Preparing to write data"):
+                    # "Preparing to write data to card <uid>"
+                    uid = line.partition(" to card ")[2].strip()
+                    result['uid'] = uid or None
+                    next_state = WRITE_WRITING
+                elif line.startswith("Data written successfully"):
+                    result['status'] = 'success'
+                    next_state = WRITE_FINISHING
+                elif line.startswith("Authentication failed"):
+                    failure = 'auth_failed'
+                elif line.startswith("Write operation failed"):
+                    failure = 'write_failed'
+                elif line.startswith("Failed to write"):
+                    result['status'] = failure or 'write_failed'
+                    next_state = WRITE_FINISHING
+                elif line.startswith("Returning to read mode"):
+                    # Back in read mode without a result line
+                    result['status'] = failure or 'unknown'
+                    next_state = WRITE_DONE
+            elif state == WRITE_FINISHING:
+                if line.startswith("Returning to read mode") or line.startswith("Ready for next card"):
+                    next_state = WRITE_DONE
+            
+            if next_state != state:
+                state = next_state
+                if state in timeouts:
+                    deadline = time.monotonic() + timeouts[state]
+            elif line == "__WRITE__" and state in (WRITE_ENTERING, WRITE_SENDING):
+                # Heartbeats prove the board is alive and in write mode
+                deadline = max(deadline, time.monotonic() + 1.0)
         
-        print("Write timeout")
+        if result['status'] in WRITE_CANCEL_STATUSES and not self.cancel_write(batch, ack_timeout):
+            print("Warning: could not confirm that the Arduino dropped the write data. "
+                  "Reset the board before tapping another card, or it may be overwritten.")
+        
+        result['duration'] = time.monotonic() - start_time
+        if self.metrics is not None:
+            outcome = 'success' if result['status'] == 'success' else 'failures'
+            self.metrics.inc(f'rfidvault_write_{outcome}_total', self.port)
+        if result['status'] == 'success' and result['uid']:
+            # The writing reader drops its own copy; the others may still hold the old data
+            self.clear_card_cache(result['uid'], exclude=self.serial_conn)
+        return result
+    
+    def cancel_write(self, batch=False, ack_timeout=3.0):
+        """Make the firmware drop a payload it holds so the next card tapped isn't overwritten
+
+        A single write returns to read mode; a batch session stays open and
+        waits for the payload again. Returns True once the firmware confirms.
+        """
+        if self.firmware_versions.get(self.port):
+            # Every firmware that answers PING with a version knows CANCEL_WRITE
+            if not self.send_command("CANCEL_WRITE"):
+                return False
+            return self.wait_for_line("Write cancelled" if batch else "Returning to read mode", ack_timeout)
+        # The original firmware has no way out of write mode, and in it takes
+        # any line, a cancel command included, as the payload; only a reset helps
+        if not self.reset_board():
+            return False
+        return self.start_batch_session(ack_timeout) if batch else True
+    
+    def pulse_dtr(self):
+        """Drop and raise DTR, which resets boards that reset when the port opens"""
+        self.serial_conn.dtr = False
+        time.sleep(0.1)
+        self.serial_conn.dtr = True
+    
+    def reset_board(self, boot_timeout=5.0):
+        """Reset the board and wait for its ready banner, returning True once it is back"""
+        print("Resetting the Arduino to clear the write data...")
+        try:
+            self.pulse_dtr()
+        except Exception as e:
+            # Not a real serial port, or a board without auto-reset
+            print(f"Could not reset the Arduino: {e}")
+            return False
+        return self.wait_for_line("RFID Reader ready", boot_timeout)
+    
+    def wait_for_line(self, prefix, timeout):
+        """Wait for a firmware line starting with prefix, returning True if it arrived"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            line = self.read_line()
+            if line.startswith(prefix):
+                return True
+            if "RFID Reader ready" in line:
+                return False
+        return False
+    
+    def start_batch_session(self, ack_timeout=3.0):
+        """Put the firmware into a multi-card write session"""
+        if self.serial_conn and self.serial_conn.is_open:
+            self.serial_conn.reset_input_buffer()
+        for _ in range(2):
+            if not self.send_command("START_BATCH"):
+                return False
+            if self.wait_for_line("Entering batch write mode", ack_timeout):
+                return True
+            # The board may have been booting when the command arrived
         return False
     
-    def monitor_cards(self, keyboard_output=False):
+    def end_batch_session(self, ack_timeout=3.0):
+        """Leave the multi-card write session and return the firmware to read mode"""
+        self.send_command("END_BATCH")
+        return self.wait_for_line("Returning to read mode", ack_timeout)
+    
+    def write_batch(self, payloads, card_timeout=30, retries=0):
+        """Write each payload to its own card over one connection, reporting as it goes"""
+        print("Entering batch write mode...")
+        if not self.start_batch_session():
+            print("Arduino did not enter batch write mode")
+            return []
+        
+        results = []
+        try:
+            for index, payload in enumerate(payloads, 1):
+                if len(payload.encode()) > PAYLOAD_CAPACITY:
+                    print(f"Warning: payload {index} truncated to {PAYLOAD_CAPACITY} bytes")
+                    payload = truncate_payload(payload)
+                print(f"[{index}] Present card for: {payload}")
+                for attempt in range(retries + 1):
+                    result = self.run_write(payload, card_timeout, batch=True, verbose=False)
+                    print(f"[{index}] uid={result['uid'] or '-'} data={payload!r} "
+                          f"status={result['status']} duration={result['duration']:.2f}s")
+                    if result['status'] in ('success', 'reset', 'card_timeout', 'not_connected'):
+                        break
+                results.append(result)
+                if result['status'] in ('reset', 'card_timeout', 'not_connected'):
+                    # The session is gone (or nobody is presenting cards); stop here
+                    print(WRITE_STATUS_MESSAGES[result['status']])
+                    break
+        finally:
+            if not results or results[-1]['status'] != 'reset':
+                self.end_batch_session()
+        
+        written = sum(1 for result in results if result['status'] == 'success')
+        print(f"Batch complete: {written}/{len(results)} cards written")
+        return results
+    
+    def monitor_cards(self, keyboard_output=False, watch_stores=True):
         """Monitor for card reads and handle them"""
         print("Monitoring for cards... (Press Ctrl+C to stop)")
-        print(f"Keyboard output: {'Enabled' if keyboard_output and KEYBOARD_AVAILABLE else 'Disabled'}")
+        print(f"Keyboard output: {'Enabled' if keyboard_output and keyboard_available() else 'Disabled'}")
         
         self.running = True
+        self.start_readers()
+        if watch_stores:
+            self.start_store_watcher()
+        if len(self.readers) > 1:
+            print(f"Readers: {', '.join(reader.source for reader in self.readers)}")
+        active = len(self.readers)
         try:
             while self.running:
-                line = self.read_line()
-                if line and line.startswith("START_CARD-"):
-                    self.handle_card_read(line, keyboard_output)
-                elif line and line.strip():
-                    print(f"Arduino: {line}")
-                time.sleep(0.1)
+                # Block until a reader thread hands over a batch; the
+                # timeout only matters while idle so Ctrl+C is still noticed.
+                # All readers feed this one queue, so store updates are
+                # applied by a single thread in arrival order.
+                try:
+                    source, lines = self.line_queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if lines is None:
+                    print(f"Serial reader stopped: {source}")
+                    active -= 1
+                    if not active:
+                        break
+                    continue
+                if self.metrics is not None:
+                    now = time.monotonic()
+                    if source in self.last_arrival:
+                        self.metrics.observe('rfidvault_serial_interarrival_seconds', source,
+                                             now - self.last_arrival[source])
+                    self.last_arrival[source] = now
+                    self.metrics.inc('rfidvault_lines_total', source, len(lines))
+                for line in lines:
+                    self.handle_line(line, keyboard_output, source)
         except KeyboardInterrupt:
-            self.running = False
             print("\nStopping monitor...")
+        finally:
+            self.running = False
+            self.stop_readers()
+            self.stop_store_watcher()
+            self.stop_keyboard_worker()
+            self.print_debounce_summary()
+            # Always persist deferred card updates on shutdown or Ctrl+C
+            self.disable_write_behind()
     
-    def handle_card_read(self, line, keyboard_output=False):
+    def handle_line(self, line, keyboard_output=False, source=None):
+        """Dispatch a single raw line received from the Arduino"""
+        if line.startswith(b"START_CARD-"):
+            if self.metrics is None:
+                self.handle_card_read(line, keyboard_output, source)
+                return
+            start = time.perf_counter()
+            self.handle_card_read(line, keyboard_output, source)
+            self.metrics.observe('rfidvault_handle_seconds', source, time.perf_counter() - start)
+        elif line.strip():
+            if self.metrics is not None and is_reset_line(line.decode(errors='replace')):
+                self.metrics.inc('rfidvault_resets_total', source)
+            if len(self.ports) > 1:
+                print(f"Arduino [{source}]: {line.decode(errors='replace')}")
+            else:
+                print(f"Arduino: {line.decode(errors='replace')}")
+    
+    def handle_card_read(self, line, keyboard_output=False, source=None):
         """Handle a card read event"""
-        try:
-            # Parse: START_CARD-UUID_CARRIED-DATA
-            parts = line.replace("START_CARD-", "").split("_CARRIED-")
-            if len(parts) != 2:
-                print(f"Invalid card format: {line}")
+        # Parse: START_CARD-UUID_CARRIED-DATA
+        parsed = parse_card_line(line)
+        if parsed is None:
+            if isinstance(line, (bytes, bytearray)):
+                line = line.decode(errors='replace')
+            print(f"Invalid card format: {line}")
+            if self.metrics is not None:
+                self.metrics.inc('rfidvault_parse_failures_total', source)
+            return
+        uuid, data = parsed
+        if self.debouncer is not None:
+            repeats = self.debouncer.check(uuid, data, source)
+            if repeats:
+                if self.metrics is not None:
+                    self.metrics.inc('rfidvault_repeat_reads_total', source)
+                if self.report_repeats:
+                    print(f"Still present: {uuid} (repeat {repeats})")
                 return
-            
-            uuid, data = parts
+        self.handle_card(uuid, data, keyboard_output, source)
+    
+    def enable_debounce(self, window=2.0, by_data=False, max_entries=1024, report_repeats=False):
+        """Ignore repeat reads of the same card within window seconds of its last sighting"""
+        self.debouncer = ReadDebouncer(window, by_data, max_entries)
+        self.report_repeats = report_repeats
+    
+    def print_debounce_summary(self):
+        """Report suppressed repeats and the cards still on a reader when monitoring stops"""
+        if self.debouncer is None or not self.debouncer.suppressed:
+            return
+        print(f"Debounce: {self.debouncer.suppressed} repeat read(s) suppressed")
+        for key, repeats in self.debouncer.still_present().items():
+            if not repeats:
+                # Seen once recently; not known to be sitting on the reader
+                continue
+            source, uuid = key[:2]
+            where = f" on {source}" if source is not None and len(self.ports) > 1 else ""
+            print(f"  Still present: {uuid}{where} ({repeats} repeat(s))")
+    
+    def handle_card(self, uuid, data, keyboard_output=False, source=None):
+        """Record a parsed card read and produce its output"""
+        try:
             timestamp = datetime.now().isoformat()
             
             # Save card data
-            self.cards[uuid] = {
-                'data': data,
-                'last_seen': timestamp,
-                'read_count': self.cards.get(uuid, {}).get('read_count', 0) + 1
-            }
-            self.save_cards()
+            info = self.record_read(uuid, data, timestamp)
+            if self.metrics is not None:
+                self.metrics.inc('rfidvault_card_events_total', source)
             
             print(f"\n--- Card Read ---")
+            if source and len(self.ports) > 1:
+                print(f"Reader: {source}")
             print(f"UUID: {uuid}")
             print(f"Data: {data}")
-            print(f"Read count: {self.cards[uuid]['read_count']}")
+            print(f"Read count: {info['read_count']}")
             
             # Check for associations
+            association = self.associations.get(uuid)
             output_text = None
-            if uuid in self.associations:
-                output_text = self.associations[uuid]
+            if association is not None:
+                output_text = association
                 print(f"Associated text: {output_text}")
             elif data and data != "EMPTY":
                 output_text = data
                 print(f"Using card data for output")
             
+            self.publish_event({
+                'uid': uuid,
+                'data': data,
+                'reader': source or self.port,
+                'timestamp': timestamp,
+                'read_count': info['read_count'],
+                'association': association,
+                'output': output_text,
+            })
+            
             # Keyboard output
-            if keyboard_output and KEYBOARD_AVAILABLE and output_text:
-                self.type_text(output_text)
+            if keyboard_output and keyboard_available() and output_text:
+                self.type_text(output_text, source)
             
             print("--- End ---\n")
             
         except Exception as e:
             print(f"Error handling card read: {e}")
     
-    def type_text(self, text):
-        """Type text using keyboard simulation"""
-        if not KEYBOARD_AVAILABLE:
+    def add_event_sink(self, sink):
+        """Register a callable that receives every card event as a dict"""
+        self.event_sinks.append(sink)
+    
+    def publish_event(self, event):
+        """Hand a card event to every registered sink"""
+        for sink in self.event_sinks:
+            try:
+                sink(event)
+            except Exception as e:
+                print(f"Error in event sink: {e}")
+    
+    def type_text(self, text, source=None):
+        """Queue text for the keyboard worker to type"""
+        if not keyboard_available():
             print("Keyboard output not available")
             return
+        if self.keyboard_worker is None:
+            self.start_keyboard_worker()
         
-        try:
-            print(f"Typing: {text}")
-            # Small delay before typing
-            time.sleep(0.5)
-            
-            # Use pynput to type the text
-            kb = keyboard.Controller()
-            kb.type(text)
-            
-        except Exception as e:
-            print(f"Error typing text: {e}")
+        if self.keyboard_worker.submit(text, source):
+            print(f"Typing: {text} (queued: {self.keyboard_worker.depth()})")
+        elif not self.keyboard_worker.is_alive():
+            reason = f" ({self.keyboard_worker.error})" if self.keyboard_worker.error else ""
+            print(f"Keyboard output not available{reason}, dropped: {text}")
+        else:
+            print(f"Keyboard queue full, dropped: {text}")
+    
+    def start_keyboard_worker(self, pre_delay=0.5, key_interval=0.0, max_queue=32, overflow='drop-oldest'):
+        """Start typing keyboard output on a background thread"""
+        if self.keyboard_worker is not None:
+            return
+        self.keyboard_worker = KeyboardWorker(pre_delay, key_interval, max_queue, overflow)
+        self.keyboard_worker.metrics = self.metrics
+        self.keyboard_worker.start()
+    
+    def stop_keyboard_worker(self):
+        """Stop the keyboard worker, discarding text it has not typed yet"""
+        if self.keyboard_worker is None:
+            return
+        self.keyboard_worker.stop()
+        self.keyboard_worker.join(timeout=2)
+        stats = self.keyboard_worker.stats()
+        if stats['dropped'] or stats['depth']:
+            print(f"Keyboard output: {stats['typed']} typed, {stats['dropped']} dropped, "
+                  f"{stats['depth']} not typed")
+        self.keyboard_worker = None
+    
+    def start_metrics(self, port, host='127.0.0.1'):
+        """Collect metrics and serve them over HTTP in the Prometheus text format"""
+        if self.metrics_server is not None:
+            return
+        self.metrics = Metrics()
+        if self.keyboard_worker is not None:
+            self.keyboard_worker.metrics = self.metrics
+        self.metrics_server = start_metrics_server(self.metrics, host, port)
+        print(f"Metrics: http://{host}:{port}/metrics")
+    
+    def stop_metrics(self):
+        """Stop serving metrics"""
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+            self.metrics_server.server_close()
+            self.metrics_server = None
     
     def associate_uuid_text(self, uuid, text):
         """Associate a UUID with custom text"""
@@ -231,42 +2892,133 @@ class RFIDTool:
         self.save_associations()
         print(f"Associated UUID {uuid} with text: {text}")
     
+    def snapshot_associations(self):
+        """Return a copy of the associations that daemon clients can't change underneath"""
+        with self.store_lock:
+            return dict(self.associations.items())
+    
     def list_cards(self):
         """List all saved cards"""
-        if not self.cards:
+        # Copies, so cards read by the monitor meanwhile can't break the loop
+        cards = self.snapshot_cards()
+        if not cards:
             print("No cards saved")
             return
         
+        associations = self.snapshot_associations()
         print("\n--- Saved Cards ---")
-        for uuid, info in self.cards.items():
+        for uuid, info in cards.items():
             print(f"UUID: {uuid}")
             print(f"  Data: {info['data']}")
             print(f"  Last seen: {info['last_seen']}")
             print(f"  Read count: {info['read_count']}")
-            if uuid in self.associations:
-                print(f"  Associated text: {self.associations[uuid]}")
+            if uuid in associations:
+                print(f"  Associated text: {associations[uuid]}")
             print()
     
     def list_associations(self):
         """List all UUID-text associations"""
-        if not self.associations:
+        associations = self.snapshot_associations()
+        if not associations:
             print("No associations saved")
             return
         
         print("\n--- UUID Associations ---")
-        for uuid, text in self.associations.items():
+        for uuid, text in associations.items():
             print(f"{uuid} -> {text}")
         print()
     
     def delete_card(self, uuid):
         """Delete a saved card"""
         if uuid in self.cards:
-            del self.cards[uuid]
-            self.save_cards()
+            with self.cards_lock:
+                self.cards.pop(uuid, None)
+                self.pending_uids.add(uuid)
+            self.mark_cards_dirty(uuid)
             print(f"Deleted card: {uuid}")
         else:
             print(f"Card not found: {uuid}")
     
+    def handle_control_request(self, request):
+        """Run a CLI command received by the daemon and return its output"""
+        command = request.get('command')
+        ok = True
+        if isinstance(sys.stdout, ThreadLocalStdout):
+            capture = sys.stdout.capture()
+        else:
+            capture = contextlib.redirect_stdout(io.StringIO())
+        with capture as output:
+            # Only commands that talk to the board wait for it; a second one
+            # fails at once rather than running after its client gave up
+            if command == 'ping':
+                print("pong")
+            elif command == 'write':
+                if self.command_lock.acquire(blocking=False):
+                    try:
+                        with self.exclusive_serial():
+                            ok = self.write_to_card(request['data'], request.get('timeout', 30))
+                    finally:
+                        self.command_lock.release()
+                else:
+                    ok = False
+                    print("Reader busy with another write, try again later")
+            elif command == 'associate':
+                with self.store_lock:
+                    self.associate_uuid_text(request['uuid'], request['text'])
+            elif command == 'list-cards':
+                self.list_cards()
+            elif command == 'list-associations':
+                self.list_associations()
+            elif command == 'delete-card':
+                with self.store_lock:
+                    self.delete_card(request['uuid'])
+            elif command == 'delete-association':
+                with self.store_lock:
+                    self.delete_association(request['uuid'])
+            else:
+                ok = False
+                print(f"Unknown command: {command}")
+        return {'ok': ok, 'output': output.getvalue()}
+    
+    def serve(self, socket_path, keyboard_output=False, watch_stores=True):
+        """Monitor cards while accepting CLI commands on a Unix socket"""
+        if ControlServer is None:
+            print("Daemon mode needs Unix domain sockets, which this platform lacks")
+            return
+        if os.path.exists(socket_path):
+            if send_daemon_request(socket_path, {'command': 'ping'}) is not None:
+                print(f"A daemon is already running on {socket_path}")
+                return
+            os.remove(socket_path)
+        
+        if not isinstance(sys.stdout, ThreadLocalStdout):
+            sys.stdout = ThreadLocalStdout(sys.stdout)
+        server = ControlServer(socket_path, self)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        print(f"Daemon listening on {socket_path}")
+        try:
+            self.monitor_cards(keyboard_output, watch_stores)
+        finally:
+            server.shutdown()
+            server.server_close()
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+    
+    def migrate_to_sqlite(self, sqlite_db=None):
+        """Copy the JSON cards and associations into the SQLite database"""
+        json_storage = JSONStorage(self.cards_db, self.associations_db,
+                                   journal=os.path.exists(self.cards_db + ".journal"))
+        cards = json_storage.load_cards()
+        associations = json_storage.load_associations()
+        sqlite_db = sqlite_db or self.sqlite_db
+        sqlite_storage = SQLiteStorage(sqlite_db)
+        try:
+            sqlite_storage.import_json(cards, associations)
+        finally:
+            sqlite_storage.close()
+        print(f"Migrated {len(cards)} cards and {len(associations)} associations to {sqlite_db}")
+    
     def delete_association(self, uuid):
         """Delete a UUID association"""
         if uuid in self.associations:
@@ -278,24 +3030,116 @@ class RFIDTool:
 
 def main():
     parser = argparse.ArgumentParser(description='RFID CLI Tool')
-    parser.add_argument('--port', '-p', required=True, help='Serial port (e.g., COM3 or /dev/ttyUSB0)')
+    parser.add_argument('--port', '-p', action='append', default=[],
+                       help='Serial port (e.g., COM3 or /dev/ttyUSB0); repeat to monitor several readers. '
+                            'Only needed by monitor, serve, write and write-batch')
+    parser.add_argument('--port-file', help='File listing one serial port per line')
     parser.add_argument('--baudrate', '-b', type=int, default=115200, help='Baudrate (default: 115200)')
+    parser.add_argument('--connect-timeout', type=float, default=5.0,
+                       help='Seconds to wait for the board to answer after connecting (default: 5)')
+    parser.add_argument('--storage', choices=['json', 'journal', 'sqlite', 'binary'], default='json',
+                       help='Card storage backend (default: json)')
+    parser.add_argument('--sqlite-db', default='config/rfid_vault.db',
+                       help='SQLite database for --storage sqlite (default: config/rfid_vault.db)')
+    parser.add_argument('--compact-cards', action='store_true',
+                       help='Keep JSON and journal cards in a compact in-memory table')
+    parser.add_argument('--compact-threshold', type=int, default=10000,
+                       help='Journal records before compacting into a snapshot (default: 10000)')
+    parser.add_argument('--socket', default='config/rfidvault.sock',
+                       help='Control socket of the serve daemon (default: config/rfidvault.sock)')
+    parser.add_argument('--no-daemon', action='store_true',
+                       help='Always run commands directly instead of through a running daemon')
     
     subparsers = parser.add_subparsers(dest='command', help='Commands')
     
     # Monitor command
     monitor_parser = subparsers.add_parser('monitor', help='Monitor for card reads')
-    monitor_parser.add_argument('--keyboard', '-k', action='store_true', 
-                               help='Enable keyboard output for card data/associations')
+    serve_parser = subparsers.add_parser('serve', help='Monitor for card reads and accept commands from other invocations')
+    for monitor_options in (monitor_parser, serve_parser):
+        monitor_options.add_argument('--keyboard', '-k', action='store_true', 
+                                    help='Enable keyboard output for card data/associations')
+        monitor_options.add_argument('--type-delay', type=float, default=0.5,
+                                    help='Seconds to wait before typing each output (default: 0.5)')
+        monitor_options.add_argument('--type-interval', type=float, default=0.0,
+                                    help='Seconds between typed keys (default: 0, as fast as possible)')
+        monitor_options.add_argument('--type-queue', type=int, default=32,
+                                    help='Outputs waiting to be typed before overflow applies (default: 32)')
+        monitor_options.add_argument('--type-overflow', choices=KeyboardWorker.OVERFLOW_POLICIES,
+                                    default='drop-oldest',
+                                    help='What to do when the typing queue is full (default: drop-oldest)')
+        monitor_options.add_argument('--write-behind', action='store_true',
+                                    help='Save card reads in background batches instead of on every tap '
+                                         '(always on with --storage binary)')
+        monitor_options.add_argument('--flush-interval', type=float, default=5.0,
+                                    help='Seconds between write-behind flushes (default: 5)')
+        monitor_options.add_argument('--flush-threshold', type=int, default=100,
+                                    help='Flush early after this many unsaved reads (default: 100)')
+        monitor_options.add_argument('--debounce', type=float, default=0,
+                                    help='Treat reads of a card within this many seconds of its last read '
+                                         'as one (default: 0, every read counts)')
+        monitor_options.add_argument('--debounce-by-data', action='store_true',
+                                    help='Count a read with different card data as a new event')
+        monitor_options.add_argument('--debounce-size', type=int, default=1024,
+                                    help='Cards remembered for debouncing (default: 1024)')
+        monitor_options.add_argument('--report-repeats', action='store_true',
+                                    help='Print a line for each suppressed repeat read')
+        monitor_options.add_argument('--holdoff', type=int,
+                                    help='Milliseconds the reader waits before reporting the same card again '
+                                         '(firmware default: 1000)')
+        monitor_options.add_argument('--output', choices=['text', 'ndjson'], default='text',
+                                    help='text: readable blocks; ndjson: one JSON object per card event, '
+                                         'nothing else is printed (default: text)')
+        monitor_options.add_argument('--output-file', default='-',
+                                    help="Where ndjson events go: '-' for stdout, a file or a FIFO (default: -)")
+        monitor_options.add_argument('--flush-latency', type=float, default=0.1,
+                                    help='Longest an ndjson event stays buffered, in seconds (default: 0.1)')
+        monitor_options.add_argument('--webhook', metavar='URL',
+                                    help='POST card events as JSON arrays to this URL')
+        monitor_options.add_argument('--webhook-batch', type=int, default=100,
+                                    help='Most events per webhook request (default: 100)')
+        monitor_options.add_argument('--webhook-latency', type=float, default=0.5,
+                                    help='Longest an event waits for its batch to fill, in seconds (default: 0.5)')
+        monitor_options.add_argument('--webhook-spool', default='config/webhook_spool.ndjson',
+                                    help='Where events wait while the webhook is down '
+                                         '(default: config/webhook_spool.ndjson)')
+        monitor_options.add_argument('--metrics-port', type=int,
+                                    help='Serve Prometheus metrics on this port (e.g. 9464)')
+        monitor_options.add_argument('--metrics-host', default='127.0.0.1',
+                                    help='Address to serve metrics on (default: 127.0.0.1)')
+        monitor_options.add_argument('--publish', metavar='ADDRESS',
+                                    help='Publish card events to subscribers on a Unix socket path or host:port')
+        monitor_options.add_argument('--publish-buffer', type=int, default=1000,
+                                    help='Events buffered per subscriber (default: 1000)')
+        monitor_options.add_argument('--slow-consumer', choices=EventPublisherMixin.SLOW_POLICIES,
+                                    default='drop-oldest',
+                                    help='What to do when a subscriber falls a full buffer behind (default: drop-oldest)')
+        monitor_options.add_argument('--no-watch', action='store_true',
+                                    help="Don't reload the stores when another command changes them")
+        monitor_options.add_argument('--card-cache', type=int,
+                                    help='Milliseconds the reader reports a card from its cache instead of '
+                                         're-reading it, 0 to disable (firmware default: 2000)')
     
     # Write command
     write_parser = subparsers.add_parser('write', help='Write data to card')
-    write_parser.add_argument('data', help='Data to write (max 16 characters)')
+    write_parser.add_argument('data', help=f'Data to write (max {PAYLOAD_CAPACITY} bytes)')
+    write_parser.add_argument('--timeout', type=float, default=30,
+                             help='Seconds to wait for a card (default: 30)')
+    
+    # Batch write command
+    batch_parser = subparsers.add_parser('write-batch', help='Write a list of payloads to successive cards')
+    batch_parser.add_argument('file', help="File with one payload per line ('-' for stdin)")
+    batch_parser.add_argument('--timeout', type=float, default=30,
+                             help='Seconds to wait for each card (default: 30)')
+    batch_parser.add_argument('--retries', type=int, default=0,
+                             help='Times to retry a failed payload on the next card (default: 0)')
     
     # List commands
     subparsers.add_parser('list-cards', help='List all saved cards')
     subparsers.add_parser('list-associations', help='List all UUID associations')
     
+    # Migrate command
+    subparsers.add_parser('migrate-sqlite', help='Copy the JSON card and association files into the SQLite database')
+    
     # Associate command
     assoc_parser = subparsers.add_parser('associate', help='Associate UUID with text')
     assoc_parser.add_argument('uuid', help='Card UUID')
@@ -308,38 +3152,145 @@ def main():
     del_assoc_parser = subparsers.add_parser('delete-association', help='Delete UUID association')
     del_assoc_parser.add_argument('uuid', help='UUID association to delete')
     
+    # Subscribe command
+    subscribe_parser = subparsers.add_parser('subscribe', help="Print the card events a monitor started with --publish sends")
+    subscribe_parser.add_argument('address', help='Unix socket path or host:port given to --publish')
+    
+    convert_parser = subparsers.add_parser('convert', help='Convert a cards or associations store between JSON and binary (.rvs)')
+    convert_parser.add_argument('source', help='Store to read')
+    convert_parser.add_argument('destination', help='Store to write; a .rvs extension selects the binary format')
+    
     args = parser.parse_args()
     
     if not args.command:
         parser.print_help()
         return
     
+    if args.command == 'subscribe':
+        try:
+            subscribe_events(args.address)
+        except OSError as e:
+            print(f"Cannot subscribe to {args.address}: {e}", file=sys.stderr)
+            sys.exit(1)
+        except KeyboardInterrupt:
+            pass
+        return
+    
+    if args.command == 'convert':
+        try:
+            count = convert_store(args.source, args.destination)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Cannot convert {args.source}: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Converted {count} entries from {args.source} to {args.destination}")
+        return
+    
+    # Hand the command to a running daemon if there is one
+    if args.command in DAEMON_COMMANDS and not args.no_daemon:
+        request = {key: value for key, value in vars(args).items()
+                   if key in ('command', 'data', 'timeout', 'uuid', 'text')}
+        response = send_daemon_request(args.socket, request, timeout=getattr(args, 'timeout', 0) + 10)
+        if response is not None:
+            print(response['output'], end='')
+            sys.exit(0 if response['ok'] else 1)
+    
+    ports = list(args.port)
+    if args.port_file:
+        with open(args.port_file, 'r') as f:
+            ports.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    args.port = ports
+    
     # Commands that don't need serial connection
-    if args.command in ['list-cards', 'list-associations']:
-        tool = RFIDTool(args.port, args.baudrate)
+    if args.command in OFFLINE_COMMANDS:
+        tool = RFIDTool(args.port, args.baudrate, args.storage, args.compact_threshold, args.sqlite_db,
+                        compact_cards=args.compact_cards)
         if args.command == 'list-cards':
             tool.list_cards()
         elif args.command == 'list-associations':
             tool.list_associations()
+        elif args.command == 'migrate-sqlite':
+            tool.migrate_to_sqlite(args.sqlite_db)
+        elif args.command == 'associate':
+            tool.associate_uuid_text(args.uuid, args.text)
+        elif args.command == 'delete-card':
+            tool.delete_card(args.uuid)
+        elif args.command == 'delete-association':
+            tool.delete_association(args.uuid)
+        tool.storage.close()
         return
     
+    if not ports:
+        parser.error('at least one --port (or --port-file) is required')
+    
     # Commands that need serial connection
-    tool = RFIDTool(args.port, args.baudrate)
+    event_output = None
+    if args.command in ('monitor', 'serve') and args.output == 'ndjson':
+        # Events are the only output; open the sink before stdout is silenced
+        event_output = NDJSONSink.open(args.output_file, args.flush_latency)
+        sys.stdout = open(os.devnull, 'w')
+    publisher = None
+    if args.command in ('monitor', 'serve') and args.publish:
+        try:
+            publisher = start_event_publisher(args.publish, args.publish_buffer, args.slow_consumer)
+        except (OSError, ValueError) as e:
+            parser.error(f"cannot publish on {args.publish}: {e}")
+    webhook = None
+    if args.command in ('monitor', 'serve') and args.webhook:
+        try:
+            webhook = WebhookSink(args.webhook, args.webhook_batch, args.webhook_latency, args.webhook_spool)
+        except ValueError as e:
+            parser.error(str(e))
+    tool = RFIDTool(args.port, args.baudrate, args.storage, args.compact_threshold, args.sqlite_db,
+                    compact_cards=args.compact_cards)
     
-    if not tool.connect():
+    if not tool.connect(args.connect_timeout):
+        if event_output is not None:
+            print(f"Failed to connect to {', '.join(args.port)}", file=sys.stderr)
+            event_output.close()
+        if webhook is not None:
+            webhook.close()
+        if publisher is not None:
+            publisher.close()
         return
     
     try:
-        if args.command == 'monitor':
-            tool.monitor_cards(keyboard_output=args.keyboard)
+        if args.command in ('monitor', 'serve'):
+            if event_output is not None:
+                tool.add_event_sink(event_output)
+            if webhook is not None:
+                tool.add_event_sink(webhook)
+            if publisher is not None:
+                tool.add_event_sink(publisher)
+                print(f"Publishing card events on {args.publish}")
+            if args.write_behind or args.storage == 'binary':
+                # Binary snapshots are rewritten whole, so their saves are always batched
+                tool.enable_write_behind(args.flush_interval, args.flush_threshold)
+            if args.metrics_port:
+                tool.start_metrics(args.metrics_port, args.metrics_host)
+            if args.keyboard and keyboard_available():
+                tool.start_keyboard_worker(args.type_delay, args.type_interval, args.type_queue,
+                                           args.type_overflow)
+            if args.holdoff is not None:
+                tool.set_holdoff(args.holdoff)
+            if args.card_cache is not None:
+                tool.set_card_cache(args.card_cache)
+            if args.debounce > 0:
+                tool.enable_debounce(args.debounce, args.debounce_by_data, args.debounce_size,
+                                     args.report_repeats)
+            if args.command == 'serve':
+                tool.serve(args.socket, keyboard_output=args.keyboard, watch_stores=not args.no_watch)
+            else:
+                tool.monitor_cards(keyboard_output=args.keyboard, watch_stores=not args.no_watch)
         elif args.command == 'write':
-            tool.write_to_card(args.data)
-        elif args.command == 'associate':
-            tool.associate_uuid_text(args.uuid, args.text)
-        elif args.command == 'delete-card':
-            tool.delete_card(args.uuid)
-        elif args.command == 'delete-association':
-            tool.delete_association(args.uuid)
+            tool.write_to_card(args.data, args.timeout)
+        elif args.command == 'write-batch':
+            if args.file == '-':
+                payloads = [line.rstrip('\r\n') for line in sys.stdin]
+            else:
+                with open(args.file, 'r') as f:
+                    payloads = [line.rstrip('\r\n') for line in f]
+            tool.write_batch([payload for payload in payloads if payload.strip()],
+                             args.timeout, args.retries)
     
     finally:
         tool.disconnect()
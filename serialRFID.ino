@@ -9,6 +9,9 @@
 #include <MFRC522DriverPinSimple.h>
 #include <MFRC522Debug.h>
 
+// Reported in the PONG reply so the host can check what it is talking to
+#define FIRMWARE_VERSION "1.2.0"
+
 // Pin configuration
 MFRC522DriverPinSimple ss_pin(5);
 MFRC522DriverSPI driver{ss_pin};
@@ -16,14 +19,22 @@ MFRC522 mfrc522{driver};
 
 // RFID key and block configuration
 MFRC522::MIFARE_Key key;
-byte blockAddress = 2;
+byte blockAddress = 2; // First payload block
 byte bufferblocksize = 18;
 byte blockDataRead[18];
 
+// Multi-block payloads (MIFARE Classic 1K: 64 blocks, every 4th is a sector trailer)
+const byte CARD_BLOCKS = 64;
+const byte MAX_PAYLOAD_BLOCKS = 46; // Blocks 2, 4-6, 8-10, ... 60-62
+byte payloadBlocks[MAX_PAYLOAD_BLOCKS];
+byte payloadData[MAX_PAYLOAD_BLOCKS][16];
+byte payloadBlockCount = 0;
+
 // Mode control
 enum Mode {
   READ_MODE,
-  WRITE_MODE
+  WRITE_MODE,
+  BATCH_WRITE_MODE // Write one payload per card until END_BATCH
 };
 
 Mode currentMode = READ_MODE;
@@ -31,6 +42,41 @@ unsigned long lastWriteIndicator = 0;
 const unsigned long WRITE_INDICATOR_INTERVAL = 1000; // 1 second
 String dataToWrite = ""; // Data to write when in write mode
 bool dataReceived = false;
+String lastWrittenUid = ""; // Card written last in a batch session
+
+// The main loop never blocks: card polling, serial input and heartbeats are
+// all scheduled from millis()
+const unsigned long CARD_POLL_INTERVAL = 20;
+unsigned long lastCardPoll = 0;
+
+// Serial input is collected a byte at a time into the current line
+const unsigned int MAX_COMMAND_LENGTH = 128;
+String commandBuffer = "";
+
+// Multi-block payload being received
+const unsigned long BLOCK_LINE_TIMEOUT = 1000;
+byte expectedBlocks = 0; // Block lines announced by BLOCKS, 0 when none are pending
+unsigned long lastBlockLineTime = 0;
+
+// A card is written once it has been selected for WRITE_SETTLE_TIME
+const unsigned long WRITE_SETTLE_TIME = 600;
+bool writePending = false;
+unsigned long writeStartTime = 0;
+String writeUid = "";
+
+// Recently reported cards. A card is not reported again within rereadHoldoff
+// ms of its last report, while a different card is read straight away; a card
+// seen again within cacheFreshness ms of its last read is reported from the
+// cached data without another authenticate-and-read
+const byte RECENT_UIDS = 8;
+unsigned long rereadHoldoff = 1000; // Changed with "HOLDOFF <ms>"
+unsigned long cacheFreshness = 2000; // Changed with "CACHE <ms>", 0 disables the cache
+String recentUids[RECENT_UIDS];
+String recentUidData[RECENT_UIDS];
+unsigned long recentUidTimes[RECENT_UIDS]; // Last report
+unsigned long recentUidReadTimes[RECENT_UIDS]; // Last read from the card
+bool recentUidCached[RECENT_UIDS];
+byte nextRecentUid = 0;
 
 void setup() {
   Serial.begin(115200);
@@ -48,77 +94,200 @@ void setup() {
   }
   
   Serial.println(F("RFID Reader ready. Send 'START_WRITE' to enter write mode."));
+  Serial.println(F("Send 'START_BATCH' to write several cards, 'END_BATCH' to stop."));
 }
 
 void loop() {
-  // Check for serial commands
-  checkSerialCommands();
+  // Consume whatever serial input has arrived without waiting for the rest
+  pollSerial();
+  unsigned long now = millis();
+  
+  // Give up on a multi-block payload whose lines stopped arriving
+  if (expectedBlocks > 0 && now - lastBlockLineTime >= BLOCK_LINE_TIMEOUT) {
+    expectedBlocks = 0;
+    payloadBlockCount = 0;
+    Serial.println("Invalid block data");
+  }
   
   // Handle write mode indicator
-  if (currentMode == WRITE_MODE) {
-    unsigned long currentTime = millis();
-    if (currentTime - lastWriteIndicator >= WRITE_INDICATOR_INTERVAL) {
+  if (currentMode != READ_MODE) {
+    if (now - lastWriteIndicator >= WRITE_INDICATOR_INTERVAL) {
       Serial.println("__WRITE__");
-      lastWriteIndicator = currentTime;
+      lastWriteIndicator = now;
+    }
+  }
+  
+  // A selected card is settling before it is written; keep servicing serial meanwhile
+  if (writePending) {
+    if (now - writeStartTime >= WRITE_SETTLE_TIME) {
+      finishCardWrite();
     }
+    return;
   }
   
+  // Don't talk to cards while payload lines stream in, so the RX buffer keeps up
+  if (expectedBlocks > 0 || now - lastCardPoll < CARD_POLL_INTERVAL) {
+    return;
+  }
+  lastCardPoll = now;
+  
   // Check if a new card is present
   if (!mfrc522.PICC_IsNewCardPresent() || !mfrc522.PICC_ReadCardSerial()) {
-    delay(50);
     return;
   }
 
   // Handle card based on current mode
   if (currentMode == READ_MODE) {
     handleCardRead();
-  } else if (currentMode == WRITE_MODE) {
-    if (dataReceived) {
-      handleCardWrite();
+  } else if (currentMode == WRITE_MODE || currentMode == BATCH_WRITE_MODE) {
+    if (dataReceived && currentMode == BATCH_WRITE_MODE && cardUid() == lastWrittenUid) {
+      // The card just written is still being presented; wait for the next one
+      haltCard();
+    } else if (dataReceived) {
+      startCardWrite();
     } else {
       // In write mode but no data received yet, just read the card
       handleCardRead();
     }
   }
-
-  delay(1000); // Prevent rapid re-reads
 }
 
-void checkSerialCommands() {
-  if (Serial.available()) {
-    // Read with timeout to prevent blocking
-    String command = "";
-    unsigned long startTime = millis();
-    
-    while (Serial.available() && (millis() - startTime) < 1000) {
-      char c = Serial.read();
-      if (c == '\n' || c == '\r') {
-        break;
+void pollSerial() {
+  while (Serial.available()) {
+    char c = Serial.read();
+    if (c == '\n' || c == '\r') {
+      commandBuffer.trim();
+      if (commandBuffer.length() > 0) {
+        handleCommand(commandBuffer);
       }
-      command += c;
+      commandBuffer = "";
+    } else if (commandBuffer.length() < MAX_COMMAND_LENGTH) {
+      commandBuffer += c;
     }
-    
-    command.trim();
-    
-    if (command.length() > 0) {
-      if (command == "START_WRITE") {
-        currentMode = WRITE_MODE;
-        dataReceived = false;
-        dataToWrite = "";
-        Serial.println("Entering write mode. Send data to write, then present card.");
-        lastWriteIndicator = millis();
-      } else if (currentMode == WRITE_MODE && !dataReceived) {
-        // In write mode, store the data to write
-        dataToWrite = command;
-        dataReceived = true;
-        Serial.println("Data received. Present card to write: " + dataToWrite);
-        Serial.println("Waiting for card...");
-      }
+  }
+}
+
+void cancelPendingWrite() {
+  expectedBlocks = 0;
+  if (writePending) {
+    writePending = false;
+    haltCard();
+  }
+}
+
+void handleCommand(String command) {
+  if (command == "PING") {
+    // Readiness check from the host; answered in every mode
+    Serial.println("PONG " FIRMWARE_VERSION);
+  } else if (command == "START_WRITE") {
+    cancelPendingWrite();
+    currentMode = WRITE_MODE;
+    dataReceived = false;
+    dataToWrite = "";
+    Serial.println("Entering write mode. Send data to write, then present card.");
+    lastWriteIndicator = millis();
+  } else if (command == "START_BATCH") {
+    cancelPendingWrite();
+    currentMode = BATCH_WRITE_MODE;
+    dataReceived = false;
+    dataToWrite = "";
+    lastWrittenUid = "";
+    Serial.println("Entering batch write mode. Send data, then present each card.");
+    lastWriteIndicator = millis();
+  } else if (command == "END_BATCH") {
+    cancelPendingWrite();
+    currentMode = READ_MODE;
+    dataReceived = false;
+    dataToWrite = "";
+    Serial.println("Returning to read mode");
+  } else if (command == "CANCEL_WRITE") {
+    // The host gave up on a write; drop the payload so the next card isn't written with it
+    cancelPendingWrite();
+    payloadBlockCount = 0;
+    dataReceived = false;
+    dataToWrite = "";
+    if (currentMode == BATCH_WRITE_MODE) {
+      // Stay in the session and wait for the payload again
+      Serial.println("Write cancelled");
+    } else {
+      currentMode = READ_MODE;
+      Serial.println("Returning to read mode");
     }
+  } else if (command.startsWith("HOLDOFF ")) {
+    rereadHoldoff = command.substring(8).toInt();
+    Serial.println("Holdoff set to " + String(rereadHoldoff) + " ms");
+  } else if (command.startsWith("CACHE ")) {
+    cacheFreshness = command.substring(6).toInt();
+    Serial.println("Cache freshness set to " + String(cacheFreshness) + " ms");
+  } else if (command == "CLEAR_CACHE" || command.startsWith("CLEAR_CACHE ")) {
+    // Drop cached card data, e.g. after the host wrote a card on another reader
+    invalidateCache(command.substring(12));
+    Serial.println("Cache cleared");
+  } else if (expectedBlocks > 0) {
+    receivePayloadBlock(command);
+  } else if ((currentMode == WRITE_MODE || currentMode == BATCH_WRITE_MODE) && !dataReceived
+             && command.startsWith("BLOCKS ")) {
+    // Multi-block payload: "BLOCKS <n>" followed by n "<block> <32 hex>" lines,
+    // streamed by the host without waiting for per-block acknowledgements
+    int count = command.substring(7).toInt();
+    if (count > 0 && count <= MAX_PAYLOAD_BLOCKS) {
+      expectedBlocks = count;
+      payloadBlockCount = 0;
+      lastBlockLineTime = millis();
+    } else {
+      Serial.println("Invalid block data");
+    }
+  } else if ((currentMode == WRITE_MODE || currentMode == BATCH_WRITE_MODE) && !dataReceived) {
+    // In write mode, store the data to write (single block)
+    dataToWrite = command;
+    payloadBlocks[0] = blockAddress;
+    memset(payloadData[0], 0, 16);
+    for (int i = 0; i < dataToWrite.length() && i < 16; i++) {
+      payloadData[0][i] = dataToWrite[i];
+    }
+    payloadBlockCount = 1;
+    dataReceived = true;
+    Serial.println("Data received. Present card to write: " + dataToWrite);
+    Serial.println("Waiting for card...");
   }
 }
 
-void handleCardRead() {
+byte hexNibble(char c) {
+  if (c >= '0' && c <= '9') return c - '0';
+  if (c >= 'A' && c <= 'F') return c - 'A' + 10;
+  if (c >= 'a' && c <= 'f') return c - 'a' + 10;
+  return 0;
+}
+
+void receivePayloadBlock(String line) {
+  // One "<block> <32 hex>" line of a multi-block payload
+  int space = line.indexOf(' ');
+  int block = space < 0 ? -1 : line.substring(0, space).toInt();
+  if (space < 0 || line.length() != (unsigned int)(space + 33)
+      || block < blockAddress || block >= CARD_BLOCKS || block % 4 == 3) {
+    // Never touch the manufacturer block or sector trailers
+    expectedBlocks = 0;
+    payloadBlockCount = 0;
+    Serial.println("Invalid block data");
+    return;
+  }
+  payloadBlocks[payloadBlockCount] = block;
+  for (byte i = 0; i < 16; i++) {
+    payloadData[payloadBlockCount][i] = (hexNibble(line[space + 1 + i * 2]) << 4) | hexNibble(line[space + 2 + i * 2]);
+  }
+  payloadBlockCount++;
+  lastBlockLineTime = millis();
+  
+  if (payloadBlockCount == expectedBlocks) {
+    expectedBlocks = 0;
+    dataReceived = true;
+    dataToWrite = String(payloadBlockCount) + " blocks";
+    Serial.println("Data received. Present card to write: " + dataToWrite);
+    Serial.println("Waiting for card...");
+  }
+}
+
+String cardUid() {
   // Get card UID as hex string
   String uid = "";
   for (byte i = 0; i < mfrc522.uid.size; i++) {
@@ -127,95 +296,168 @@ void handleCardRead() {
     uid += String(mfrc522.uid.uidByte[i], HEX);
   }
   uid.toUpperCase();
+  return uid;
+}
+
+void haltCard() {
+  // Halt communication with the card
+  mfrc522.PICC_HaltA();
+  mfrc522.PCD_StopCrypto1();
+}
+
+int findRecentUid(String uid) {
+  for (byte i = 0; i < RECENT_UIDS; i++) {
+    if (recentUids[i] == uid) {
+      return i;
+    }
+  }
+  return -1;
+}
+
+void invalidateCache(String uid) {
+  // Forget cached data for one card, or for every card when uid is empty
+  for (byte i = 0; i < RECENT_UIDS; i++) {
+    if (uid.length() == 0 || recentUids[i] == uid) {
+      recentUidCached[i] = false;
+    }
+  }
+}
+
+void handleCardRead() {
+  String uid = cardUid();
+  unsigned long now = millis();
+  int slot = findRecentUid(uid);
+  
+  // Same card still on the reader; other cards are read straight away
+  if (slot >= 0 && now - recentUidTimes[slot] < rereadHoldoff) {
+    haltCard();
+    return;
+  }
   
-  // Read data from card
-  String cardData = readDataFromCard();
+  String cardData;
+  if (slot >= 0 && recentUidCached[slot] && now - recentUidReadTimes[slot] < cacheFreshness) {
+    // Seen a moment ago: skip authenticating and reading the card again
+    cardData = recentUidData[slot];
+  } else {
+    // Read data from card
+    cardData = readDataFromCard();
+    if (slot < 0) {
+      // Reuse the oldest slot
+      slot = nextRecentUid;
+      nextRecentUid = (nextRecentUid + 1) % RECENT_UIDS;
+      recentUids[slot] = uid;
+    }
+    recentUidData[slot] = cardData;
+    recentUidReadTimes[slot] = now;
+    recentUidCached[slot] = cardData != "AUTH_ERROR" && cardData != "READ_ERROR";
+  }
   
   // Send in specified format: START_CARD-UUID_CARRIED-DATA
   Serial.println("START_CARD-" + uid + "_CARRIED-" + cardData);
+  recentUidTimes[slot] = now;
   
-  // Halt communication with the card
-  mfrc522.PICC_HaltA();
-  mfrc522.PCD_StopCrypto1();
+  haltCard();
+}
+
+void startCardWrite() {
+  writeUid = cardUid();
+  
+  // The write happens once the card has settled, to ensure stable power
+  Serial.println("Preparing to write data to card " + writeUid);
+  writePending = true;
+  writeStartTime = millis();
 }
 
-void handleCardWrite() {
-  // Add delay before write operation to ensure stable power
-  Serial.println("Preparing to write data...");
-  delay(500);
+void finishCardWrite() {
+  writePending = false;
+  invalidateCache(writeUid);
   
   // Write data to card
-  if (writeDataToCard(dataToWrite)) {
+  if (writePayloadToCard()) {
     Serial.println("Data written successfully to card");
   } else {
     Serial.println("Failed to write data to card");
   }
   
-  // Return to read mode
-  currentMode = READ_MODE;
   dataReceived = false;
   dataToWrite = "";
-  Serial.println("Returning to read mode");
+  if (currentMode == BATCH_WRITE_MODE) {
+    // Stay in the session and wait for the next payload
+    lastWrittenUid = writeUid;
+    Serial.println("Ready for next card");
+  } else {
+    // Return to read mode
+    currentMode = READ_MODE;
+    Serial.println("Returning to read mode");
+  }
   
-  // Halt communication with the card
-  mfrc522.PICC_HaltA();
-  mfrc522.PCD_StopCrypto1();
+  haltCard();
 }
 
 String readDataFromCard() {
-  // Authenticate the specified block using KEY_A = 0x60
-  if (mfrc522.PCD_Authenticate(0x60, blockAddress, &key, &(mfrc522.uid)) != 0) {
-    return "AUTH_ERROR";
-  }
+  // Read payload blocks until one holds a null terminator, authenticating
+  // once per sector and skipping sector trailers
+  String data = "";
+  int authenticatedSector = -1;
+  for (byte block = blockAddress; block < CARD_BLOCKS; block++) {
+    if (block % 4 == 3) {
+      continue;
+    }
+    
+    if (block / 4 != authenticatedSector) {
+      // Authenticate the sector using KEY_A = 0x60
+      if (mfrc522.PCD_Authenticate(0x60, block, &key, &(mfrc522.uid)) != 0) {
+        if (block == blockAddress) return "AUTH_ERROR";
+        break;
+      }
+      authenticatedSector = block / 4;
+    }
 
-  // Read data from the specified block
-  if (mfrc522.MIFARE_Read(blockAddress, blockDataRead, &bufferblocksize) != 0) {
-    return "READ_ERROR";
-  }
+    // Read data from the block
+    bufferblocksize = sizeof(blockDataRead);
+    if (mfrc522.MIFARE_Read(block, blockDataRead, &bufferblocksize) != 0) {
+      if (block == blockAddress) return "READ_ERROR";
+      break;
+    }
 
-  // Convert to string (remove null terminators and non-printable chars)
-  String data = "";
-  for (byte i = 0; i < 16; i++) {
-    if (blockDataRead[i] >= 32 && blockDataRead[i] <= 126) { // Printable ASCII
-      data += char(blockDataRead[i]);
-    } else if (blockDataRead[i] == 0) {
-      break; // Stop at null terminator
+    // Convert to string (remove null terminators and non-printable chars)
+    bool terminated = false;
+    for (byte i = 0; i < 16; i++) {
+      if (blockDataRead[i] >= 32 && blockDataRead[i] <= 126) { // Printable ASCII
+        data += char(blockDataRead[i]);
+      } else if (blockDataRead[i] == 0) {
+        terminated = true;
+        break; // Stop at null terminator
+      }
+    }
+    if (terminated) {
+      break;
     }
   }
   
   return data.length() > 0 ? data : "EMPTY";
 }
 
-bool writeDataToCard(String data) {
-  // Prepare data buffer (16 bytes for MIFARE Classic)
-  byte newBlockData[16];
-  memset(newBlockData, 0, sizeof(newBlockData)); // Clear buffer with zeros
-  
-  // Copy data to buffer (max 16 characters)
-  for (int i = 0; i < data.length() && i < 16; i++) {
-    newBlockData[i] = data[i];
-  }
-  
-  // Add delay before authentication to ensure stable communication
-  delay(100);
-  
-  // Authenticate the specified block using KEY_A = 0x60
-  if (mfrc522.PCD_Authenticate(0x60, blockAddress, &key, &(mfrc522.uid)) != 0) {
-    Serial.println("Authentication failed");
-    return false;
-  }
-  
-  // Add delay before writing
-  delay(50);
-  
-  // Write data to the specified block
-  if (mfrc522.MIFARE_Write(blockAddress, newBlockData, 16) != 0) {
-    Serial.println("Write operation failed");
-    return false;
+bool writePayloadToCard() {
+  // Write all blocks of one sector under a single authentication
+  int authenticatedSector = -1;
+  for (byte n = 0; n < payloadBlockCount; n++) {
+    byte block = payloadBlocks[n];
+    if (block / 4 != authenticatedSector) {
+      // Authenticate the sector using KEY_A = 0x60
+      if (mfrc522.PCD_Authenticate(0x60, block, &key, &(mfrc522.uid)) != 0) {
+        Serial.println("Authentication failed");
+        return false;
+      }
+      authenticatedSector = block / 4;
+    }
+    
+    // Write data to the block
+    if (mfrc522.MIFARE_Write(block, payloadData[n], 16) != 0) {
+      Serial.println("Write operation failed");
+      return false;
+    }
   }
   
-  // Add delay after writing
-  delay(100);
-  
   return true;
-}
\ No newline at end of file
+}
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Pseudo-terminal emulator of the serialRFID.ino firmware
+Exposes a pty that rfidvault.py can open as --port, so reads, writes and
+error handling can be exercised (and load tested) without a physical board.
+
+Usage:
+    python tests/arduino_emulator.py --rate 50 --count 1000
+    python tests/arduino_emulator.py --script scenario.txt --link /tmp/ttyRFID
+
+Scenario scripts contain one command per line:
+    card <uid> [data]   present a card
+    sleep <seconds>     pause
+    reset               inject a firmware reset
+    noise [bytes]       send garbage bytes on the line
+    burst <n> [rate]    present n random cards at rate taps/s
+"""
+
+import os
+import sys
+import tty
+import time
+import random
+import argparse
+import threading
+
+BANNER = [
+    "Firmware Version: 0x92 = v2.0",
+    "RFID Reader ready. Send 'START_WRITE' to enter write mode.",
+    "Send 'START_BATCH' to write several cards, 'END_BATCH' to stop.",
+]
+
+# What an ESP32 prints when it browns out and reboots mid-operation
+RESET_LINES = [
+    "ets Jun  8 2016 00:22:57",
+    "",
+    "rst:0x1 (POWERON_RESET),boot:0x13 (SPI_FAST_FLASH_BOOT)",
+]
+
+# MIFARE Classic 1K: payloads start at block 2 and skip the sector trailers
+FIRST_PAYLOAD_BLOCK = 2
+CARD_BLOCKS = 64
+PAYLOAD_BLOCKS = [block for block in range(FIRST_PAYLOAD_BLOCK, CARD_BLOCKS) if block % 4 != 3]
+
+FIRMWARE_VERSION = "1.2.0"
+
+READ_MODE = "READ_MODE"
+WRITE_MODE = "WRITE_MODE"
+BATCH_WRITE_MODE = "BATCH_WRITE_MODE"
+
+class ArduinoEmulator:
+    """Protocol-faithful stand-in for the RFID firmware on a pseudo-terminal"""
+
+    def __init__(self, write_fail_rate=0.0, write_delay=0.05, heartbeat_interval=1.0,
+                 auto_present=None, seed=None, holdoff=0.0, cache_freshness=0.0, garble_rate=0.0):
+        self.master, self.slave = os.openpty()
+        # Raw mode: no echo of host commands and no newline translation
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.write_fail_rate = write_fail_rate
+        # Fraction of single-line payloads that arrive with a corrupted byte
+        self.garble_rate = garble_rate
+        self.write_delay = write_delay
+        self.heartbeat_interval = heartbeat_interval
+        self.auto_present = auto_present
+        # Seconds before the same UID is reported again; 0 treats every
+        # present_card() as a separate tap, as load tests expect
+        self.holdoff = holdoff
+        self.last_reported = {}
+        # Seconds a card's data is reported from cache instead of re-read; 0
+        # keeps present_card(uid, data) reporting the data it was just given
+        self.cache_freshness = cache_freshness
+        self.card_cache = {}  # uid -> (data, read time)
+        self.random = random.Random(seed)
+        self.cards = {}  # uid -> {block address: 16 bytes}
+        self.mode = READ_MODE
+        self.data_to_write = None  # [(block address, 16 bytes)] once received
+        self.expected_blocks = 0
+        self.received_blocks = []
+        self.last_written_uid = None
+        self.lock = threading.Lock()
+        self.running = False
+        self.threads = []
+        self.stats = {'cards': 0, 'writes_ok': 0, 'writes_failed': 0, 'resets': 0, 'noise': 0, 'commands': 0,
+                      'cache_hits': 0}
+
+    def start(self, banner=True):
+        """Start servicing host commands and write-mode heartbeats"""
+        self.running = True
+        for target in (self.command_loop, self.heartbeat_loop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        if banner:
+            self.boot()
+
+    def stop(self):
+        """Stop the emulator and close the pty"""
+        self.running = False
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def emit(self, line):
+        """Send one line the way Serial.println does"""
+        self.emit_raw((line + "\r\n").encode())
+
+    def emit_raw(self, data):
+        """Send raw bytes to the host"""
+        with self.lock:
+            try:
+                os.write(self.master, data)
+            except OSError:
+                pass
+
+    def boot(self):
+        """Print the power-on banner and enter read mode"""
+        self.mode = READ_MODE
+        self.data_to_write = None
+        for line in BANNER:
+            self.emit(line)
+
+    def command_loop(self):
+        """Read host commands line by line, like checkSerialCommands()"""
+        buffer = b""
+        while self.running:
+            try:
+                chunk = os.read(self.master, 1024)
+            except OSError:
+                return
+            if not chunk:
+                continue
+            buffer += chunk
+            while b"\n" in buffer or b"\r" in buffer:
+                line, _, buffer = buffer.replace(b"\r", b"\n").partition(b"\n")
+                command = line.decode(errors='replace').strip()
+                if command:
+                    self.handle_command(command)
+
+    def handle_command(self, command):
+        """React to a complete command from the host"""
+        self.stats['commands'] += 1
+        if command == "PING":
+            self.emit("PONG " + FIRMWARE_VERSION)
+        elif command == "START_WRITE":
+            self.mode = WRITE_MODE
+            self.data_to_write = None
+            self.emit("Entering write mode. Send data to write, then present card.")
+            self.last_heartbeat = time.monotonic()
+        elif command == "START_BATCH":
+            self.mode = BATCH_WRITE_MODE
+            self.data_to_write = None
+            self.last_written_uid = None
+            self.emit("Entering batch write mode. Send data, then present each card.")
+            self.last_heartbeat = time.monotonic()
+        elif command == "END_BATCH":
+            self.mode = READ_MODE
+            self.data_to_write = None
+            self.expected_blocks = 0
+            self.emit("Returning to read mode")
+        elif command == "CANCEL_WRITE":
+            self.data_to_write = None
+            self.expected_blocks = 0
+            if self.mode == BATCH_WRITE_MODE:
+                self.emit("Write cancelled")
+            else:
+                self.mode = READ_MODE
+                self.emit("Returning to read mode")
+        elif command.startswith("HOLDOFF "):
+            milliseconds = int(command[8:]) if command[8:].isdigit() else 0
+            self.holdoff = milliseconds / 1000.0
+            self.emit(f"Holdoff set to {milliseconds} ms")
+        elif command.startswith("CACHE "):
+            milliseconds = int(command[6:]) if command[6:].isdigit() else 0
+            self.cache_freshness = milliseconds / 1000.0
+            self.emit(f"Cache freshness set to {milliseconds} ms")
+        elif command == "CLEAR_CACHE" or command.startswith("CLEAR_CACHE "):
+            uid = command[12:].strip()
+            if uid:
+                self.card_cache.pop(uid, None)
+            else:
+                self.card_cache.clear()
+            self.emit("Cache cleared")
+        elif self.expected_blocks:
+            self.receive_block(command)
+        elif self.mode in (WRITE_MODE, BATCH_WRITE_MODE) and self.data_to_write is None:
+            if command.startswith("BLOCKS "):
+                count = int(command[7:]) if command[7:].isdigit() else 0
+                if 0 < count <= len(PAYLOAD_BLOCKS):
+                    self.expected_blocks = count
+                    self.received_blocks = []
+                else:
+                    self.emit("Invalid block data")
+                return
+            if self.random.random() < self.garble_rate:
+                command = command[:-1] + ("#" if command[-1] != "#" else "$")
+            block = command.encode()[:16].ljust(16, b"\0")
+            self.accept_data([(FIRST_PAYLOAD_BLOCK, block)], command)
+
+    def receive_block(self, line):
+        """Collect one '<block> <hex>' line of a multi-block payload"""
+        try:
+            block, hex_data = line.split(" ", 1)
+            block, data = int(block), bytes.fromhex(hex_data)
+            if block < FIRST_PAYLOAD_BLOCK or block >= CARD_BLOCKS or block % 4 == 3 or len(data) != 16:
+                raise ValueError(line)
+        except ValueError:
+            self.expected_blocks = 0
+            self.emit("Invalid block data")
+            return
+        self.received_blocks.append((block, data))
+        if len(self.received_blocks) == self.expected_blocks:
+            self.expected_blocks = 0
+            self.accept_data(self.received_blocks, f"{len(self.received_blocks)} blocks")
+
+    def accept_data(self, blocks, echo):
+        """Store the payload to write and acknowledge it"""
+        self.data_to_write = blocks
+        self.emit("Data received. Present card to write: " + echo)
+        self.emit("Waiting for card...")
+        if self.auto_present is not None:
+            threading.Timer(self.auto_present, self.present_card).start()
+
+    def heartbeat_loop(self):
+        """Print __WRITE__ once per interval while in write mode"""
+        self.last_heartbeat = time.monotonic()
+        while self.running:
+            time.sleep(0.05)
+            if self.mode == READ_MODE:
+                continue
+            now = time.monotonic()
+            if now - self.last_heartbeat >= self.heartbeat_interval:
+                self.emit("__WRITE__")
+                self.last_heartbeat = now
+
+    def random_uid(self):
+        """Return a random 4-byte UID in the firmware's hex format"""
+        return ":".join(f"{self.random.randrange(256):02X}" for _ in range(4))
+
+    def present_card(self, uid=None, data=None):
+        """Place a card on the reader"""
+        uid = uid or self.random_uid()
+        if data is not None:
+            self.store_payload(uid, data)
+        if self.mode != READ_MODE and self.data_to_write is not None:
+            if self.mode == BATCH_WRITE_MODE and uid == self.last_written_uid:
+                # Same card still on the reader; the firmware waits for the next one
+                return
+            self.write_card(uid)
+        else:
+            now = time.monotonic()
+            if self.holdoff and now - self.last_reported.get(uid, -self.holdoff) < self.holdoff:
+                # Same card within the re-read holdoff; the firmware stays quiet
+                return
+            self.last_reported[uid] = now
+            self.stats['cards'] += 1
+            cached = self.card_cache.get(uid)
+            if cached is not None and now - cached[1] < self.cache_freshness:
+                self.stats['cache_hits'] += 1
+                payload = cached[0]
+            else:
+                payload = self.read_payload(uid)
+                self.card_cache[uid] = (payload, now)
+            self.emit(f"START_CARD-{uid}_CARRIED-{payload}")
+
+    def store_payload(self, uid, data):
+        """Lay a payload out over the card's blocks, null terminated"""
+        raw = data.encode()[:len(PAYLOAD_BLOCKS) * 16]
+        count = min(len(raw) // 16 + 1, len(PAYLOAD_BLOCKS))
+        raw = raw.ljust(count * 16, b"\0")
+        blocks = self.cards.setdefault(uid, {})
+        for i in range(count):
+            blocks[PAYLOAD_BLOCKS[i]] = raw[i * 16:(i + 1) * 16]
+
+    def read_payload(self, uid):
+        """Reassemble a card's payload the way readDataFromCard() does"""
+        blocks = self.cards.get(uid, {})
+        data = ""
+        for block in PAYLOAD_BLOCKS:
+            content = blocks.get(block, bytes(16))
+            for byte in content:
+                if byte == 0:
+                    return data or "EMPTY"
+                if 32 <= byte <= 126:
+                    data += chr(byte)
+        return data or "EMPTY"
+
+    def write_card(self, uid):
+        """Emulate handleCardWrite() for the card on the reader"""
+        self.emit("Preparing to write data to card " + uid)
+        time.sleep(self.write_delay)
+        if self.random.random() < self.write_fail_rate:
+            self.emit(self.random.choice(["Authentication failed", "Write operation failed"]))
+            self.emit("Failed to write data to card")
+            self.stats['writes_failed'] += 1
+        else:
+            blocks = self.cards.setdefault(uid, {})
+            for block, data in self.data_to_write:
+                blocks[block] = data
+            self.card_cache.pop(uid, None)
+            self.emit("Data written successfully to card")
+            self.stats['writes_ok'] += 1
+        self.data_to_write = None
+        if self.mode == BATCH_WRITE_MODE:
+            self.last_written_uid = uid
+            self.emit("Ready for next card")
+        else:
+            self.mode = READ_MODE
+            self.emit("Returning to read mode")
+
+    def inject_reset(self):
+        """Emulate a brown-out reset: boot ROM chatter, then the banner again"""
+        self.stats['resets'] += 1
+        for line in RESET_LINES:
+            self.emit(line)
+        self.boot()
+
+    def inject_noise(self, length=16):
+        """Send a burst of line noise, sometimes without a terminating newline"""
+        self.stats['noise'] += 1
+        noise = bytes(self.random.randrange(256) for _ in range(length))
+        if self.random.random() < 0.5:
+            noise += b"\r\n"
+        self.emit_raw(noise)
+
+    def run_load(self, rate, count, distinct=100, noise=0.0, reset_every=0):
+        """Present count cards at rate taps/s drawn from a pool of distinct UIDs"""
+        pool = [self.random_uid() for _ in range(max(1, distinct))]
+        interval = 1.0 / rate if rate > 0 else 0
+        deadline = time.monotonic()
+        for i in range(count):
+            if not self.running:
+                break
+            if reset_every and i and i % reset_every == 0:
+                self.inject_reset()
+            if noise and self.random.random() < noise:
+                self.inject_noise()
+            self.present_card(self.random.choice(pool))
+            deadline += interval
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def run_script(self, path):
+        """Run a scenario script (see module docstring)"""
+        with open(path, 'r') as f:
+            for line in f:
+                parts = line.split()
+                if not parts or parts[0].startswith('#'):
+                    continue
+                command, args = parts[0], parts[1:]
+                if command == "card":
+                    self.present_card(args[0], " ".join(args[1:]) or None)
+                elif command == "sleep":
+                    time.sleep(float(args[0]))
+                elif command == "reset":
+                    self.inject_reset()
+                elif command == "noise":
+                    self.inject_noise(int(args[0]) if args else 16)
+                elif command == "burst":
+                    self.run_load(float(args[1]) if len(args) > 1 else 0, int(args[0]))
+                else:
+                    print(f"Unknown scenario command: {command}")
+
+def main():
+    parser = argparse.ArgumentParser(description='serialRFID firmware emulator on a pseudo-terminal')
+    parser.add_argument('--link', help='Create a symlink to the pty at this path')
+    parser.add_argument('--script', help='Scenario script to run')
+    parser.add_argument('--rate', type=float, default=0, help='Card taps per second for load mode')
+    parser.add_argument('--count', type=int, default=0, help='Number of taps in load mode')
+    parser.add_argument('--distinct', type=int, default=100, help='Number of distinct card UIDs in load mode')
+    parser.add_argument('--noise', type=float, default=0.0, help='Probability of line noise before each tap')
+    parser.add_argument('--reset-every', type=int, default=0, help='Inject a reset every N taps')
+    parser.add_argument('--write-fail-rate', type=float, default=0.0, help='Fraction of card writes that fail')
+    parser.add_argument('--garble-rate', type=float, default=0.0,
+                        help='Fraction of single-line payloads received with a corrupted byte')
+    parser.add_argument('--auto-present', type=float, help='Present a card this many seconds after write data arrives')
+    parser.add_argument('--start-delay', type=float, default=3.0, help='Seconds to wait before load or script starts')
+    parser.add_argument('--seed', type=int, help='Random seed for reproducible runs')
+    parser.add_argument('--holdoff', type=float, default=0.0,
+                        help='Seconds before the same card is reported again (default: 0)')
+    parser.add_argument('--cache-freshness', type=float, default=0.0,
+                        help='Seconds a card is reported from cache instead of re-read (default: 0)')
+    args = parser.parse_args()
+
+    emulator = ArduinoEmulator(write_fail_rate=args.write_fail_rate,
+                               auto_present=args.auto_present, seed=args.seed, holdoff=args.holdoff,
+                               cache_freshness=args.cache_freshness, garble_rate=args.garble_rate)
+    if args.link:
+        if os.path.lexists(args.link):
+            os.remove(args.link)
+        os.symlink(emulator.port, args.link)
+    print(f"Emulator listening on {args.link or emulator.port}")
+    sys.stdout.flush()
+    emulator.start()
+
+    try:
+        time.sleep(args.start_delay)
+        start_time = time.time()
+        if args.script:
+            emulator.run_script(args.script)
+        if args.count:
+            emulator.run_load(args.rate, args.count, args.distinct, args.noise, args.reset_every)
+            elapsed = time.time() - start_time
+            print(f"Sent {args.count} taps in {elapsed:.2f}s ({args.count / elapsed:.1f} taps/s)")
+        if not args.script and not args.count:
+            print("Press Ctrl+C to stop")
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Stats: {emulator.stats}")
+        emulator.stop()
+        if args.link and os.path.islink(args.link):
+            os.remove(args.link)
+
+if __name__ == "__main__":
+    main()
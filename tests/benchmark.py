@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the rfidvault.py hot paths
+Measures line parsing, card/association persistence, association lookup and
+the memory held per card in isolation, plus end-to-end latency from bytes arriving on a (emulated)
+serial port until the card's output text is ready, and the import and launch
+time of each subcommand. Results are written as JSON with percentiles so
+runs can be compared.
+
+Usage:
+    python tests/benchmark.py --output bench.json
+    python tests/benchmark.py --sizes 1000 100000 --output new.json --compare bench.json
+"""
+
+import gc
+import os
+import io
+import sys
+import json
+import time
+import random
+import platform
+import subprocess
+import tempfile
+import argparse
+import threading
+import contextlib
+import tracemalloc
+from datetime import datetime, timedelta
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(os.path.dirname(TESTS_DIR), 'rfidvault.py')
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+sys.path.insert(0, TESTS_DIR)
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import rfidvault
+
+def summarize(samples):
+    """Summarize durations in seconds as percentiles in microseconds"""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))] * 1e6
+
+    return {
+        'unit': 'us',
+        'count': len(ordered),
+        'mean': sum(ordered) / len(ordered) * 1e6,
+        'p50': percentile(50),
+        'p90': percentile(90),
+        'p99': percentile(99),
+        'max': ordered[-1] * 1e6,
+    }
+
+def timed(func, repeats):
+    """Call func repeats times and return the individual durations"""
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def card_uid(i):
+    """Return a UID in the firmware's format for card number i"""
+    return ":".join(f"{b:02X}" for b in i.to_bytes(4, 'big'))
+
+def make_cards(count):
+    """Build a cards dict shaped like config/rfid_cards.json"""
+    now = datetime.now().isoformat()
+    return {card_uid(i): {'data': f"DATA{i:012d}", 'last_seen': now, 'read_count': i % 50 + 1}
+            for i in range(count)}
+
+def make_associations(count):
+    """Build an associations dict shaped like config/rfid_associations.json"""
+    return {card_uid(i): f"Associated text for card {i}" for i in range(count)}
+
+def reset_store():
+    """Remove any stores left in ./config by a previous benchmark"""
+    for name in os.listdir('config'):
+        os.remove(os.path.join('config', name))
+
+def quiet():
+    """Context manager that discards the tool's console output"""
+    return contextlib.redirect_stdout(open(os.devnull, 'w'))
+
+def bench_parse(iterations):
+    """Time START_CARD parsing alone and inside handle_card_read"""
+    lines = [f"START_CARD-{card_uid(i % 1000)}_CARRIED-DATA{i:012d}".encode() for i in range(iterations)]
+    results = {}
+
+    samples = []
+    for line in lines:
+        start = time.perf_counter()
+        rfidvault.parse_card_line(line)
+        samples.append(time.perf_counter() - start)
+    results['parse_card_line'] = summarize(samples)
+
+    # Write-behind with a long interval keeps persistence out of the measurement
+    with quiet():
+        tool = rfidvault.RFIDTool('bench')
+        tool.enable_write_behind(interval=3600, threshold=iterations + 1)
+        samples = []
+        for line in lines:
+            start = time.perf_counter()
+            tool.handle_card_read(line)
+            samples.append(time.perf_counter() - start)
+        tool.disable_write_behind()
+    results['handle_card_read'] = summarize(samples)
+    return results
+
+def bench_save(sizes, repeats):
+    """Time full rewrites of the cards and associations files"""
+    results = {}
+    with quiet():
+        tool = rfidvault.RFIDTool('bench')
+    for size in sizes:
+        # Large stores take seconds per save; fewer repeats keep runs bounded
+        count = repeats if size <= 100000 else max(1, repeats // 3)
+        tool.cards = make_cards(size)
+        tool.associations = make_associations(size)
+        results[f'save_cards/{size}'] = summarize(timed(tool.save_cards, count))
+        results[f'save_associations/{size}'] = summarize(timed(tool.save_associations, count))
+    tool.cards = {}
+    tool.associations = {}
+    return results
+
+def bench_lookup(sizes, iterations):
+    """Time association lookups for known and unknown UIDs"""
+    results = {}
+    rng = random.Random(0)
+    for size in sizes:
+        associations = make_associations(size)
+        keys = [card_uid(rng.randrange(size * 2)) for _ in range(iterations)]
+        samples = []
+        for key in keys:
+            start = time.perf_counter()
+            associations.get(key)
+            samples.append(time.perf_counter() - start)
+        results[f'association_lookup/{size}'] = summarize(samples)
+    return results
+
+def bench_end_to_end(count, rate, storage):
+    """Time bytes-on-the-wire to output-ready through the emulator and monitor loop"""
+    try:
+        import serial
+        from arduino_emulator import ArduinoEmulator
+    except ImportError as e:
+        print(f"Skipping end-to-end benchmark: {e}", file=sys.stderr)
+        return {}
+
+    emulator = ArduinoEmulator(seed=0)
+    emulator.start(banner=False)
+    sent = {}
+    latencies = []
+    done = threading.Event()
+
+    def on_event(event):
+        sent_at = sent.pop(event['uid'], None)
+        if sent_at is not None:
+            latencies.append(time.perf_counter() - sent_at)
+        if len(latencies) >= count:
+            done.set()
+
+    with quiet():
+        tool = rfidvault.RFIDTool(emulator.port, storage=storage)
+        tool.serial_conn = serial.Serial(emulator.port, 115200, timeout=1)
+        tool.add_event_sink(on_event)
+        monitor = threading.Thread(target=tool.monitor_cards, daemon=True)
+        monitor.start()
+        time.sleep(0.2)
+
+        interval = 1.0 / rate if rate > 0 else 0
+        deadline = time.perf_counter()
+        for i in range(count):
+            uid = card_uid(0x10000000 + i)
+            sent[uid] = time.perf_counter()
+            emulator.present_card(uid, f"E2E{i:08d}")
+            deadline += interval
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        done.wait(timeout=30)
+        tool.running = False
+        monitor.join(timeout=5)
+        tool.disconnect()
+    emulator.stop()
+    return {f'end_to_end/{storage}': summarize(latencies)}
+
+def traced_size(build):
+    """Return the bytes still allocated by build() once it returns"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        kept = build()
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del kept
+    return size
+
+def bench_memory(sizes):
+    """Compare the memory held by the cards dict and the compact CardTable"""
+    results = {}
+    start = datetime.now()
+
+    def make_distinct_cards(size):
+        # Real stores have a different last_seen per card
+        return {card_uid(i): {'data': f"DATA{i:012d}", 'last_seen': (start + timedelta(seconds=i)).isoformat(),
+                              'read_count': i % 50 + 1}
+                for i in range(size)}
+
+    for size in sizes:
+        for name, build in (('dict', lambda: make_distinct_cards(size)),
+                            ('card_table', lambda: rfidvault.CardTable(make_distinct_cards(size)))):
+            total = traced_size(build)
+            results[f'memory/{name}/{size}'] = {'unit': 'bytes', 'count': size, 'total': total,
+                                                'per_card': total / size}
+    return results
+
+def bench_cold_start(sizes, repeats):
+    """Time opening the stores and looking up one card, for JSON and binary snapshots"""
+    results = {}
+    for size in sizes:
+        count = repeats if size <= 100000 else max(1, repeats // 3)
+        reset_store()
+        cards = make_cards(size)
+        with quiet():
+            rfidvault.RFIDTool('bench').save_cards(cards)
+            rfidvault.RFIDTool('bench', storage='binary').save_cards(cards)
+        del cards
+        uid = card_uid(size // 2)
+        for storage in ('json', 'binary'):
+
+            def open_and_lookup():
+                with quiet():
+                    tool = rfidvault.RFIDTool('bench', storage=storage)
+                    tool.cards.get(uid)
+                    tool.storage.close()
+
+            results[f'cold_start/{storage}/{size}'] = summarize(timed(open_and_lookup, count))
+    return results
+
+# Launch arguments per subcommand; commands that need a board only parse their
+# arguments, which still covers every import done before connecting
+STARTUP_COMMANDS = {
+    'list-cards': ['list-cards'],
+    'list-associations': ['list-associations'],
+    'associate': ['associate', '01:02:03:04', 'Startup benchmark'],
+    'delete-association': ['delete-association', '01:02:03:04'],
+    'monitor': ['monitor', '--help'],
+    'write': ['write', '--help'],
+}
+
+def bench_startup(repeats):
+    """Time a bare import of rfidvault and a full launch of each subcommand in fresh interpreters"""
+    results = {}
+    import_code = ("import io, sys, time, contextlib; start = time.perf_counter()\n"
+                   "with contextlib.redirect_stdout(io.StringIO()): import rfidvault\n"
+                   "print(time.perf_counter() - start)")
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(SCRIPT))
+    samples = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', import_code], env=env,
+                                capture_output=True, text=True, check=True).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    results['startup/import'] = summarize(samples)
+    
+    for name, command in STARTUP_COMMANDS.items():
+        argv = [sys.executable, SCRIPT, '--no-daemon'] + command
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            subprocess.run(argv, capture_output=True)
+            samples.append(time.perf_counter() - start)
+        results[f'startup/{name}'] = summarize(samples)
+    return results
+
+def compare(results, baseline_path, tolerance):
+    """Print p50 changes against a baseline run and return the regressions"""
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)['results']
+    regressions = []
+    print(f"{'benchmark':40} {'base p50':>12} {'new p50':>12} {'change':>8}", file=sys.stderr)
+    for name, summary in results.items():
+        old = baseline.get(name)
+        if not old or not old.get('p50') or not summary.get('p50'):
+            continue
+        ratio = summary['p50'] / old['p50']
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:40} {old['p50']:12.1f} {summary['p50']:12.1f} {ratio - 1:+8.1%}{flag}", file=sys.stderr)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark rfidvault.py hot paths')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000],
+                        help='Store sizes for save and lookup benchmarks (default: 1000 100000 1000000)')
+    parser.add_argument('--iterations', type=int, default=10000, help='Iterations for parse and lookup benchmarks')
+    parser.add_argument('--repeats', type=int, default=5, help='Repeats for save benchmarks')
+    parser.add_argument('--e2e-count', type=int, default=1000, help='Taps for the end-to-end benchmark (0 to skip)')
+    parser.add_argument('--e2e-rate', type=float, default=200, help='Taps per second for the end-to-end benchmark')
+    parser.add_argument('--startup-repeats', type=int, default=10,
+                        help='Launches per subcommand for the startup benchmark (0 to skip)')
+    parser.add_argument('--storage', choices=['json', 'journal', 'sqlite', 'binary'], default='json',
+                        help='Storage backend for the end-to-end benchmark')
+    parser.add_argument('--output', '-o', help='Write JSON results to this file instead of stdout')
+    parser.add_argument('--compare', help='Baseline JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed p50 slowdown before a benchmark counts as a regression (default: 0.2)')
+    args = parser.parse_args()
+
+    original_dir = os.getcwd()
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.compare) if args.compare else None
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        # RFIDTool keeps its stores under ./config
+        os.chdir(workdir)
+        os.mkdir('config')
+        try:
+            print("Benchmarking parsing...", file=sys.stderr)
+            results.update(bench_parse(args.iterations))
+            print("Benchmarking association lookup...", file=sys.stderr)
+            results.update(bench_lookup(args.sizes, args.iterations))
+            print("Benchmarking saves...", file=sys.stderr)
+            reset_store()
+            results.update(bench_save(args.sizes, args.repeats))
+            print("Benchmarking card memory...", file=sys.stderr)
+            results.update(bench_memory(args.sizes))
+            print("Benchmarking cold start...", file=sys.stderr)
+            results.update(bench_cold_start(args.sizes, args.repeats))
+            if args.startup_repeats:
+                print("Benchmarking startup...", file=sys.stderr)
+                reset_store()
+                results.update(bench_startup(args.startup_repeats))
+            if args.e2e_count and os.name == 'posix':
+                print("Benchmarking end to end...", file=sys.stderr)
+                reset_store()
+                results.update(bench_end_to_end(args.e2e_count, args.e2e_rate, args.storage))
+        finally:
+            os.chdir(original_dir)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {output}", file=sys.stderr)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed", file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,22 @@
+"""
+Shared pytest setup for the tests that need no hardware
+Puts rfidvault.py and the firmware emulator on the import path and gives
+each test a scratch working directory holding the config/ folder the tool
+keeps its stores in.
+"""
+
+import os
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+sys.path.insert(0, TESTS_DIR)
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run the test from an empty directory with a config/ folder"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'config').mkdir()
+    return tmp_path
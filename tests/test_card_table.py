@@ -0,0 +1,66 @@
+"""
+Check the compact in-memory card table
+Round-trips UIDs through rfidvault.py's int keys and timestamps through its
+float seconds, and checks that CardTable reads back the dicts it was given.
+No hardware needed.
+
+Usage:
+    pytest tests/test_card_table.py
+"""
+
+import pytest
+
+import rfidvault
+
+UIDS = [
+    "04:A1:B2:C3",                     # 4-byte (single size)
+    "04:A1:B2:C3:D4:E5:F6",            # 7-byte (double size)
+    "04:A1:B2:C3:D4:E5:F6:07:18:29",   # 10-byte (triple size)
+    "00:00:B2:C3",                     # leading zero bytes keep the length
+]
+
+@pytest.mark.parametrize('uid', UIDS)
+def test_uid_round_trip(uid):
+    key = rfidvault.pack_uid(uid)
+    assert isinstance(key, int)
+    assert rfidvault.unpack_uid(key) == uid
+
+def test_uid_keys_are_distinct_by_length():
+    assert len({rfidvault.pack_uid(uid) for uid in ["B2:C3", "00:B2:C3", "00:00:B2:C3"]}) == 3
+
+@pytest.mark.parametrize('uid', ["04:a1:b2:c3", "04A1B2C3", "badge-17", ""])
+def test_other_uids_stay_strings(uid):
+    assert rfidvault.pack_uid(uid) == uid
+    assert rfidvault.unpack_uid(uid) == uid
+
+@pytest.mark.parametrize('timestamp', [
+    "2024-05-01T10:00:00",
+    "2024-05-01T10:00:00.000001",
+    "2024-12-31T23:59:59.999999",
+    "1969-07-20T20:17:40.500000",
+])
+def test_timestamp_round_trip(timestamp):
+    packed = rfidvault.pack_timestamp(timestamp)
+    assert isinstance(packed, float)
+    assert rfidvault.unpack_timestamp(packed) == timestamp
+
+@pytest.mark.parametrize('value', ["2024-05-01T10:00:00+02:00", "2024-05-01 10:00", "yesterday", "", None])
+def test_other_timestamps_unchanged(value):
+    assert rfidvault.pack_timestamp(value) == value
+    assert rfidvault.unpack_timestamp(value) == value
+
+def test_card_table_matches_dict():
+    cards = {uid: {'data': f"card {n}", 'last_seen': f"2024-05-0{n + 1}T10:00:00.25{n}000", 'read_count': n}
+             for n, uid in enumerate(UIDS)}
+    cards["badge-17"] = {'data': "manual", 'last_seen': "yesterday", 'read_count': 1}
+    table = rfidvault.CardTable(cards)
+    assert len(table) == len(cards)
+    assert dict(table.items()) == cards
+    assert list(table) == list(cards)
+    assert all(table[uid] == info for uid, info in cards.items())
+    assert "04:A1:B2:C3:D4:E5:F6" in table and "04:A1:B2:C3:D4:E5" not in table
+    del table["00:00:B2:C3"]
+    with pytest.raises(KeyError, match="00:00:B2:C3"):
+        table["00:00:B2:C3"]
+    with pytest.raises(KeyError):
+        del table["00:00:B2:C3"]
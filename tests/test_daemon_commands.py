@@ -0,0 +1,75 @@
+"""
+Check that daemon list commands are safe while cards are being read
+Runs list-cards and list-associations through rfidvault.py's control request
+handler while another thread records new cards and associations, as the
+monitor and other clients do in serve mode. No hardware or emulator needed.
+
+Usage:
+    pytest tests/test_daemon_commands.py
+"""
+
+import io
+import sys
+import threading
+
+import pytest
+
+import rfidvault
+
+@pytest.fixture
+def tool(workdir):
+    """An RFIDTool with no port"""
+    tool = rfidvault.RFIDTool(None)
+    # Keep saves off the read path so the reader thread churns the dict
+    tool.write_behind = True
+    tool.flush_threshold = float('inf')
+    return tool
+
+def run_while(tool, command, change):
+    """Run a control request repeatedly while change() runs on another thread"""
+    # As in serve, each thread's prints go to its own capture
+    original_stdout = sys.stdout
+    sys.stdout = rfidvault.ThreadLocalStdout(io.StringIO())
+    stop = threading.Event()
+    def churn():
+        count = 0
+        while not stop.is_set():
+            change(count)
+            count += 1
+    worker = threading.Thread(target=churn, daemon=True)
+    worker.start()
+    try:
+        results = [tool.handle_control_request({'command': command}) for _ in range(10)]
+    finally:
+        stop.set()
+        worker.join()
+        sys.stdout = original_stdout
+    return results
+
+def test_list_cards_during_reads(tool):
+    for count in range(2000):
+        tool.record_read(f"00:00:{count:04X}", "seed", "2024-01-01T00:00:00")
+    def tap(count):
+        # Add a card and drop an older one so the store changes size but stays small
+        tool.record_read(f"01:{count:06X}", "tap", "2024-01-01T00:00:00")
+        tool.delete_card(f"01:{count - 100:06X}")
+    results = run_while(tool, 'list-cards', tap)
+    for result in results:
+        assert result['ok'], result['output']
+        assert "Error" not in result['output'], result['output']
+        assert "--- Saved Cards ---" in result['output']
+
+def test_list_associations_during_changes(tool):
+    for count in range(20000):
+        tool.associations[f"00:00:{count:04X}"] = "seed"
+    # Skip the save; only the in-memory change races with the listing
+    tool.save_associations = lambda: None
+    def associate(count):
+        tool.handle_control_request({'command': 'associate',
+                                     'uuid': f"01:{count:06X}", 'text': "new"})
+        tool.handle_control_request({'command': 'delete-association',
+                                     'uuid': f"01:{count - 100:06X}"})
+    results = run_while(tool, 'list-associations', associate)
+    for result in results:
+        assert result['ok'], result['output']
+        assert "--- UUID Associations ---" in result['output']
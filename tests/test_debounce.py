@@ -0,0 +1,29 @@
+"""
+Check that repeat reads of a card left on the reader are collapsed and counted
+Feeds START_CARD lines to rfidvault.py's line handler with debouncing and
+metrics on, and checks the events, the repeat counter and the stop summary.
+No hardware needed.
+
+Usage:
+    pytest tests/test_debounce.py
+"""
+
+import rfidvault
+
+def test_repeats_counted_and_summarized(workdir, capsys):
+    tool = rfidvault.RFIDTool(None)
+    tool.enable_debounce(window=60)
+    tool.metrics = rfidvault.Metrics()
+    for _ in range(4):
+        tool.handle_line(b"START_CARD-04:A1:B2:C3_CARRIED-left", source="/dev/rfid0")
+    tool.handle_line(b"START_CARD-04:A1:B2:C4_CARRIED-tapped", source="/dev/rfid0")
+    assert tool.cards["04:A1:B2:C3"]['read_count'] == 1
+    metrics = tool.metrics.render()
+    assert 'rfidvault_repeat_reads_total{port="/dev/rfid0"} 3' in metrics
+    assert 'rfidvault_card_events_total{port="/dev/rfid0"} 2' in metrics
+    capsys.readouterr()
+    tool.print_debounce_summary()
+    summary = capsys.readouterr().out
+    assert "3 repeat read(s) suppressed" in summary
+    assert "Still present: 04:A1:B2:C3 (3 repeat(s))" in summary
+    assert "04:A1:B2:C4" not in summary
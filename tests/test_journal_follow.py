@@ -0,0 +1,70 @@
+"""
+Check that a journal-mode monitor keeps other commands' card changes
+Runs rfidvault.py's journal store with the store watcher on, as monitor does,
+while delete-card runs in a separate process, and checks that the deletion
+survives the monitor's next compaction and a restart. No hardware needed.
+
+Usage:
+    pytest tests/test_journal_follow.py
+"""
+
+import os
+import sys
+import time
+import contextlib
+import subprocess
+
+import pytest
+
+import rfidvault
+
+RFIDVAULT = os.path.abspath(rfidvault.__file__)
+TIMESTAMP = "2024-01-01T00:00:00"
+
+pytestmark = pytest.mark.usefixtures('workdir')
+
+@contextlib.contextmanager
+def watched_tool(compact_threshold):
+    """Yield a journal-mode RFIDTool watching its stores"""
+    tool = rfidvault.RFIDTool(None, storage='journal', compact_threshold=compact_threshold)
+    try:
+        tool.start_store_watcher(poll_interval=0.1)
+        yield tool
+    finally:
+        tool.stop_store_watcher()
+        tool.storage.close()
+
+def run_command(*args):
+    subprocess.run([sys.executable, RFIDVAULT, '--storage', 'journal', *args],
+                   check=True, stdout=subprocess.DEVNULL)
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+def restarted_cards():
+    return set(rfidvault.RFIDTool(None, storage='journal').cards)
+
+def test_delete_survives_compaction():
+    with watched_tool(compact_threshold=5) as tool:
+        for count in range(3):
+            tool.record_read(f"AA:{count:02X}", "card", TIMESTAMP)
+        run_command('delete-card', "AA:01")
+        wait_for(lambda: "AA:01" not in tool.cards)
+        # Enough taps to compact, which used to rotate the deletion away
+        for count in range(5):
+            tool.record_read(f"BB:{count:02X}", "card", TIMESTAMP)
+        tool.journal.close()
+        assert "AA:01" not in restarted_cards()
+
+def test_compaction_by_another_process():
+    with watched_tool(compact_threshold=1000) as tool:
+        for count in range(3):
+            tool.record_read(f"AA:{count:02X}", "card", TIMESTAMP)
+        run_command('--compact-threshold', '1', 'delete-card', "AA:01")
+        wait_for(lambda: "AA:01" not in tool.cards)
+        tool.record_read("CC:00", "card", TIMESTAMP)
+        tool.journal.close()
+        assert restarted_cards() == {"AA:00", "AA:02", "CC:00"}
@@ -0,0 +1,78 @@
+"""
+Check how serial input is split into lines
+Feeds rfidvault.py's LineFramer from an in-memory port that hands out bytes
+in the chunks a USB serial driver might, and checks the lines that come out.
+No hardware needed.
+
+Usage:
+    pytest tests/test_line_framer.py
+"""
+
+import rfidvault
+
+CARD = b"START_CARD-04:A1:B2:C3_CARRIED-hello"
+
+class ChunkedPort:
+    """Serves each chunk as one burst: the first byte blocks, the rest is waiting"""
+
+    def __init__(self, chunks):
+        self.chunks = [bytearray(chunk) for chunk in chunks]
+        self.idle = True  # the last burst is used up; the next read waits for one
+
+    @property
+    def in_waiting(self):
+        return 0 if self.idle or not self.chunks else len(self.chunks[0])
+
+    def readinto(self, buffer):
+        if not self.chunks:
+            return 0
+        self.idle = False
+        chunk = self.chunks[0]
+        count = min(len(buffer), len(chunk))
+        buffer[:count] = chunk[:count]
+        del chunk[:count]
+        if not chunk:
+            self.chunks.pop(0)
+            self.idle = True
+        return count
+
+def frame(chunks, max_line=4096):
+    """Return the lines completed after each chunk"""
+    framer = rfidvault.LineFramer(max_line)
+    port = ChunkedPort(chunks)
+    completed = []
+    while port.chunks:
+        framer.receive(port)
+        completed.append(framer.lines())
+    return completed
+
+def test_partial_line():
+    assert frame([CARD[:10], CARD[10:25], CARD[25:] + b"\r\n"]) == [[], [], [CARD]]
+
+def test_several_lines_in_one_chunk():
+    chunk = CARD + b"\r\nData received\r\n\r\nWaiting for card...\r\nPrepar"
+    assert frame([chunk, b"ing to write data...\n"]) == [
+        [CARD, b"Data received", b"Waiting for card..."], [b"Preparing to write data..."]]
+
+def test_crlf_and_bare_lf():
+    # CR stays attached until the LF arrives, then is stripped with the line
+    assert frame([CARD + b"\r", b"\n" + CARD + b"\n"]) == [[], [CARD, CARD]]
+    assert rfidvault.parse_card_line(frame([CARD + b"\r\n"])[0][0]) == ("04:A1:B2:C3", "hello")
+
+def test_overflow_drops_runaway_line():
+    # Noise that never ends a line fills the buffer and is dropped; only the
+    # part after the last reset comes out, and framing resumes after it
+    noise = b"\xff" * 64
+    lines = frame([noise, noise, b"tail\n" + CARD + b"\n"], max_line=64)
+    assert sum(lines, []) == [b"tail", CARD]
+    assert rfidvault.parse_card_line(b"tail") is None
+
+def test_read_after_full_buffer():
+    # The read that finds the buffer full starts over at the front instead of
+    # reading into the space past its end
+    framer = rfidvault.LineFramer(8)
+    port = ChunkedPort([b"\xff" * 8, b"ok\n"])
+    assert framer.receive(port) == 8
+    assert framer.lines() == []
+    assert framer.receive(port) == 3
+    assert framer.lines() == [b"ok"]
@@ -0,0 +1,21 @@
+"""
+Check that board resets are counted from every line that shows one
+Feeds the ready banner, ESP32 boot ROM output and ordinary firmware chatter
+to rfidvault.py's line handler with metrics on. No hardware needed.
+
+Usage:
+    pytest tests/test_reset_metrics.py
+"""
+
+import rfidvault
+
+def test_boot_rom_lines_count_as_resets(workdir):
+    tool = rfidvault.RFIDTool(None)
+    tool.metrics = rfidvault.Metrics()
+    for line in (b"RFID Reader ready",
+                 b"ets Jun  8 2016 00:22:57",
+                 b"rst:0x1 (POWERON_RESET),boot:0x13 (SPI_FAST_FLASH_BOOT)",
+                 b"Write cancelled",
+                 b"Card detected, resets ignored"):
+        tool.handle_line(line, source="/dev/rfid0")
+    assert 'rfidvault_resets_total{port="/dev/rfid0"} 3' in tool.metrics.render()
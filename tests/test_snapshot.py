@@ -0,0 +1,145 @@
+"""
+Check the binary snapshot store against plain dicts
+Round-trips cards and associations through rfidvault.py's .rvs format and
+convert, edits snapshot tables across saves and rebases the way the tool
+does, and checks that convert rejects stores it can't represent. No
+hardware needed.
+
+Usage:
+    pytest tests/test_snapshot.py
+"""
+
+import os
+import json
+import random
+
+import pytest
+
+import rfidvault
+
+pytestmark = pytest.mark.usefixtures('workdir')
+
+CARDS = {
+    "04:A1:B2:C3": {"data": "hello", "last_seen": "2024-05-01T12:30:45.123456", "read_count": 3},
+    "00:00:01": {"data": "leading zero bytes", "last_seen": "2024-05-01T12:30:45", "read_count": 1},
+    "AA:BB:CC:DD:EE:FF:11": {"data": "hello", "last_seen": "2024-05-01T12:30:45", "read_count": 0},
+}
+ODD_CARDS = {
+    # Timestamps that are not naive ISO strings are kept as text
+    "01:02:03:04": {"data": "space", "last_seen": "2024-05-01 12:30:45", "read_count": 1},
+    "01:02:03:05": {"data": "zone", "last_seen": "2024-05-01T12:30:45+02:00", "read_count": 1},
+    "01:02:03:06": {"data": "words", "last_seen": "yesterday", "read_count": 1},
+    "01:02:03:07": {"data": None, "last_seen": None, "read_count": 0},
+    "01:02:03:08": {"data": "", "last_seen": "", "read_count": 2},
+}
+# UIDs outside the firmware's upper-case hex format are stored as text
+ODD_UIDS = ["aa:bb:cc:dd", "AA:BB:CC:D", "AABBCCDD", "01:02:0G", "badge-17", "", "ключ"]
+
+def card(count):
+    return {"data": f"payload {count}", "last_seen": f"2024-05-01T12:{count % 60:02d}:00",
+            "read_count": count}
+
+def round_trip(mapping, kind):
+    """Write mapping to a snapshot and read it back"""
+    rfidvault.write_snapshot("store.rvs", mapping, kind)
+    table = rfidvault.open_snapshot_table("store.rvs")
+    try:
+        return dict(table.items()), {uid: table[uid] for uid in mapping}
+    finally:
+        table.close()
+
+def test_convert_round_trip():
+    associations = {uid: f"text for {uid}" for uid in CARDS}
+    associations["02:02"] = ""
+    for store in (CARDS, associations):
+        with open("in.json", 'w') as f:
+            json.dump(store, f)
+        assert rfidvault.convert_store("in.json", "store.rvs") == len(store)
+        assert rfidvault.convert_store("store.rvs", "out.json") == len(store)
+        with open("out.json") as f:
+            assert json.load(f) == store
+
+def test_odd_values():
+    items, lookups = round_trip(ODD_CARDS, rfidvault.SNAPSHOT_CARDS)
+    assert items == ODD_CARDS
+    assert lookups == ODD_CARDS
+    associations = {"01:02": None, "01:03": "text"}
+    items, lookups = round_trip(associations, rfidvault.SNAPSHOT_ASSOCIATIONS)
+    assert items == associations == lookups
+
+def test_non_hex_uids():
+    store = {uid: card(count) for count, uid in enumerate(ODD_UIDS)}
+    store.update(CARDS)
+    items, lookups = round_trip(store, rfidvault.SNAPSHOT_CARDS)
+    assert items == store
+    assert lookups == store
+    rfidvault.write_snapshot("store.rvs", store, rfidvault.SNAPSHOT_CARDS)
+    table = rfidvault.open_snapshot_table("store.rvs")
+    # Same letters, other case: a different text UID, not a hit on the hex one
+    assert "04:a1:b2:c3" not in table
+    assert "AA:BB:CC:DD" not in table
+    table.close()
+
+def test_delete_and_readd_across_rebase():
+    rfidvault.write_snapshot("cards.rvs", CARDS, rfidvault.SNAPSHOT_CARDS)
+    table = rfidvault.open_snapshot_table("cards.rvs")
+    model = dict(CARDS)
+    gone, readded = "04:A1:B2:C3", "00:00:01"
+    for uid in (gone, readded):
+        del table[uid]
+        del model[uid]
+    table["05:05"] = model["05:05"] = card(5)
+    # Saved from a copy, as the tool does, with edits landing mid-save
+    saved = table.copy()
+    rfidvault.write_snapshot("cards.rvs", saved, rfidvault.SNAPSHOT_CARDS)
+    table[readded] = model[readded] = card(1)
+    del table["05:05"], model["05:05"]
+    table.rebase("cards.rvs", saved)
+    assert dict(table.items()) == model
+    assert len(table) == len(model)
+    assert gone not in table and "05:05" not in table
+    # And once more with the table itself written
+    rfidvault.write_snapshot("cards.rvs", table, rfidvault.SNAPSHOT_CARDS)
+    table.rebase("cards.rvs")
+    assert dict(table.items()) == model
+    assert not table.changes and not table.deleted
+    table.close()
+
+def test_random_edits_across_rebases():
+    rng = random.Random(0)
+    uids = [f"{count:02X}:00" for count in range(40)] + ODD_UIDS
+    table = rfidvault.SnapshotTable()
+    model = {}
+    for step in range(300):
+        uid = rng.choice(uids)
+        if uid in model and rng.random() < 0.4:
+            del table[uid]
+            del model[uid]
+        else:
+            table[uid] = model[uid] = card(step)
+        if step % 25 == 24:
+            saved = table.copy()
+            rfidvault.write_snapshot("cards.rvs", saved, rfidvault.SNAPSHOT_CARDS)
+            for _ in range(rng.randrange(4)):
+                uid = rng.choice(uids)
+                if uid in model:
+                    del table[uid]
+                    del model[uid]
+                else:
+                    table[uid] = model[uid] = card(step)
+            table.rebase("cards.rvs", saved)
+        assert dict(table.items()) == model, step
+        assert len(table) == len(model), step
+    table.close()
+
+@pytest.mark.parametrize('store', [
+    ["04:A1:B2:C3"],
+    {"04:A1:B2:C3": "text", "04:A1:B2:C4": CARDS["04:A1:B2:C3"]},
+    {"04:A1:B2:C3": 17},
+])
+def test_convert_rejects_unsupported_json(store):
+    with open("in.json", 'w') as f:
+        json.dump(store, f)
+    with pytest.raises(ValueError):
+        rfidvault.convert_store("in.json", "out.rvs")
+    assert not os.path.exists("out.rvs")
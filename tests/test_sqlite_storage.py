@@ -0,0 +1,49 @@
+"""
+Check the SQLite card store against a temporary database
+Records reads of the same UID, bulk-loads JSON dicts, and checks the rows
+that land in rfidvault.py's SQLiteStorage. No hardware needed.
+
+Usage:
+    pytest tests/test_sqlite_storage.py
+"""
+
+import pytest
+
+import rfidvault
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = rfidvault.SQLiteStorage(str(tmp_path / "vault.db"))
+    yield storage
+    storage.close()
+
+@pytest.mark.parametrize('returning', [True, False], ids=['returning', 'select'])
+def test_record_read_inserts_then_updates(storage, returning):
+    # Older SQLite without RETURNING reads the count back with a SELECT
+    storage.returning = storage.returning and returning
+    first = storage.record_read("04:A1:B2:C3", "hello", "2024-05-01T10:00:00")
+    assert first == {'data': "hello", 'last_seen': "2024-05-01T10:00:00", 'read_count': 1}
+    second = storage.record_read("04:A1:B2:C3", "rewritten", "2024-05-01T10:05:00")
+    assert second == {'data': "rewritten", 'last_seen': "2024-05-01T10:05:00", 'read_count': 2}
+    cards = storage.load_cards()
+    assert len(cards) == 1
+    assert cards["04:A1:B2:C3"] == second
+
+def test_import_json_round_trip(storage):
+    cards = {
+        "04:A1:B2:C3": {'data': "hello", 'last_seen': "2024-05-01T10:00:00", 'read_count': 3},
+        "04:A1:B2:C4": {'data': "", 'last_seen': "2024-05-02T11:30:00.250000", 'read_count': 1},
+    }
+    associations = {"04:A1:B2:C3": "front door", "04:A1:B2:C5": "unused card"}
+    storage.import_json(cards, associations)
+    assert dict(storage.load_cards().items()) == cards
+    assert dict(storage.load_associations().items()) == associations
+    # Importing again replaces rows instead of duplicating them
+    storage.import_json(cards, associations)
+    assert len(storage.load_cards()) == 2
+    assert storage.record_read("04:A1:B2:C3", "hello", "2024-05-03T09:00:00")['read_count'] == 4
+
+def test_wal_mode(storage, tmp_path):
+    assert storage.query_one("PRAGMA journal_mode")[0] == 'wal'
+    storage.record_read("04:A1:B2:C3", "hello", "2024-05-01T10:00:00")
+    assert (tmp_path / "vault.db-wal").exists()
@@ -0,0 +1,73 @@
+"""
+Check that reloading a changed store never holds up a save
+Drives rfidvault.py's StoreWatcher with a slow parse function and saves made
+through written() while it parses, as a tap would in plain JSON mode. No
+hardware needed.
+
+Usage:
+    pytest tests/test_store_watcher.py
+"""
+
+import json
+import time
+import threading
+
+import rfidvault
+
+PARSE_DELAY = 0.5
+
+def write_store(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+def slow_watcher(path, reloaded, parsing):
+    """A watcher on path whose parse takes PARSE_DELAY, not yet started"""
+    def parse(path, raw):
+        parsing.set()
+        time.sleep(PARSE_DELAY)
+        return json.loads(raw)
+    return rfidvault.StoreWatcher({path: reloaded.append}, parse=parse)
+
+def test_save_during_reload_does_not_wait(tmp_path):
+    path = str(tmp_path / "store.json")
+    write_store(path, {"a": 1})
+    reloaded, parsing = [], threading.Event()
+    watcher = slow_watcher(path, reloaded, parsing)
+    write_store(path, {"a": 2})
+    checker = threading.Thread(target=watcher.check, args=(path,))
+    checker.start()
+    assert parsing.wait(2)
+    start = time.monotonic()
+    with watcher.written(path):
+        write_store(path, {"a": 3, "saved": True})
+    waited = time.monotonic() - start
+    checker.join()
+    assert waited < PARSE_DELAY / 2, waited
+    # The content parsed before the save is older than it and is dropped
+    assert reloaded == []
+
+def test_outside_change_is_applied(tmp_path):
+    path = str(tmp_path / "store.json")
+    write_store(path, {"a": 1})
+    reloaded = []
+    watcher = slow_watcher(path, reloaded, threading.Event())
+    write_store(path, {"a": 2, "b": 3})
+    watcher.check(path)
+    assert reloaded == [{"a": 2, "b": 3}]
+
+def test_own_save_is_not_reloaded(tmp_path):
+    path = str(tmp_path / "store.json")
+    write_store(path, {"a": 1})
+    reloaded, parsing = [], threading.Event()
+    watcher = slow_watcher(path, reloaded, parsing)
+    with watcher.written(path):
+        write_store(path, {"a": 2})
+    watcher.check(path)
+    # Seen by the watcher while the save was still inside written()
+    with watcher.written(path):
+        write_store(path, {"a": 3, "b": 4})
+        checker = threading.Thread(target=watcher.check, args=(path,))
+        checker.start()
+        assert parsing.wait(2)
+    checker.join()
+    assert reloaded == []
@@ -0,0 +1,54 @@
+"""
+Check that webhook events survive an outage of the endpoint
+Posts card events through rfidvault.py's WebhookSink to the stand-in from
+tests/webhook_server.py, stops the stand-in so events are retried and
+spooled to disk, restarts it, and checks every event arrives once and in
+order. No hardware needed.
+
+Usage:
+    pytest tests/test_webhook_sink.py
+"""
+
+import os
+import time
+
+import rfidvault
+from webhook_server import WebhookState, start_server, stop_server
+
+def wait_for(condition, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+def send(sink, uids):
+    for uid in uids:
+        sink({'uid': uid, 'data': "hello", 'timestamp': "2024-05-01T10:00:00"})
+
+def test_outage_spools_and_drains_in_order(tmp_path):
+    state = WebhookState()
+    server = start_server(state)
+    port = server.server_address[1]
+    spool_path = str(tmp_path / "spool.ndjson")
+    sink = rfidvault.WebhookSink(f"http://127.0.0.1:{port}/events", batch_size=5, batch_latency=0.05,
+                                 spool_path=spool_path, retries=1, timeout=1.0, max_backoff=0.5)
+    uids = [f"04:A1:B2:{n:02X}" for n in range(30)]
+    try:
+        send(sink, uids[:10])
+        wait_for(lambda: state.events == 10)
+
+        stop_server(server)
+        send(sink, uids[10:20])
+        wait_for(lambda: sink.spooled == 10)
+        assert os.path.exists(spool_path)
+
+        server = start_server(state, port=port)
+        send(sink, uids[20:])
+        wait_for(lambda: state.events == 30)
+        assert state.uids == uids
+        # Removed once the drain that sent the last spooled batch finishes
+        wait_for(lambda: not os.path.exists(spool_path))
+    finally:
+        sink.close()
+        stop_server(server)
+    assert sink.sent == 30
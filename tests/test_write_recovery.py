@@ -0,0 +1,135 @@
+"""
+Check that failed writes leave the board out of write mode
+Drives rfidvault.py's write state machine against the firmware emulator
+through a card timeout, a reset mid-write and a garbled payload, and checks
+that the next card tapped is read rather than overwritten. Also checks that
+payloads spelling a firmware command are written rather than executed.
+
+Usage:
+    pytest tests/test_write_recovery.py
+"""
+
+import threading
+import contextlib
+
+import pytest
+
+import rfidvault
+from arduino_emulator import ArduinoEmulator, READ_MODE, BATCH_WRITE_MODE
+
+pytestmark = pytest.mark.usefixtures('workdir')
+
+UID = "01:02:03:04"
+
+@contextlib.contextmanager
+def connected_tool(firmware_version=None, boot_after_open=False, **emulator_args):
+    """Yield an emulator and an RFIDTool connected to it
+
+    With boot_after_open the board comes up only once the port is open, the
+    way boards that reset on open do: the banner arrives first, and PINGs
+    sent meanwhile are answered after it.
+    """
+    emulator = ArduinoEmulator(seed=0, **emulator_args)
+    if boot_after_open:
+        def power_on():
+            emulator.boot()
+            emulator.start(banner=False)
+        threading.Timer(0.6, power_on).start()
+    else:
+        emulator.start(banner=False)
+    try:
+        tool = rfidvault.RFIDTool(emulator.port)
+        assert tool.connect(ready_timeout=3)
+        if firmware_version is not None:
+            tool.firmware_versions[tool.port] = firmware_version
+        yield emulator, tool
+    finally:
+        tool.disconnect()
+        emulator.stop()
+
+def assert_next_card_is_read(emulator):
+    """The board must be back in read mode with nothing left to write"""
+    assert emulator.mode == READ_MODE
+    assert emulator.data_to_write is None
+    writes = emulator.stats['writes_ok']
+    emulator.present_card(UID)
+    assert emulator.stats['writes_ok'] == writes
+    assert emulator.read_payload(UID) == "EMPTY"
+
+def test_card_timeout_cancels_write():
+    with connected_tool() as (emulator, tool):
+        result = tool.run_write("lost", card_timeout=0.5)
+        assert result['status'] == 'card_timeout'
+        assert_next_card_is_read(emulator)
+
+def test_banner_after_open_still_cancels_write():
+    with connected_tool(boot_after_open=True) as (emulator, tool):
+        assert tool.firmware_versions[tool.port] == "1.2.0"
+        # Replies to the PINGs sent while the board booted were drained
+        assert tool.serial_conn.in_waiting == 0
+        sent, resets = [], []
+        send_command = tool.send_command
+        tool.send_command = lambda command: sent.append(command) or send_command(command)
+        tool.reset_board = lambda *args: resets.append(args)
+        result = tool.run_write("lost", card_timeout=0.5)
+        assert result['status'] == 'card_timeout'
+        assert sent[-1] == "CANCEL_WRITE"
+        assert resets == []
+        assert_next_card_is_read(emulator)
+
+def test_card_timeout_resets_unversioned_firmware():
+    # The original firmware would take a cancel command for the payload, so
+    # the board is reset instead (simulated here; a pty has no DTR line)
+    with connected_tool(firmware_version="") as (emulator, tool):
+        tool.pulse_dtr = emulator.inject_reset
+        commands = emulator.stats['commands']
+        result = tool.run_write("lost", card_timeout=0.5)
+        assert result['status'] == 'card_timeout'
+        # START_WRITE and the payload, nothing after them
+        assert emulator.stats['commands'] == commands + 2
+        assert_next_card_is_read(emulator)
+
+def test_unversioned_firmware_without_reset(capsys):
+    with connected_tool(firmware_version="") as (emulator, tool):
+        result = tool.run_write("lost", card_timeout=0.5)
+        assert result['status'] == 'card_timeout'
+        # Nothing was sent that could become the payload; the user is told to reset
+        assert emulator.data_to_write is not None
+        assert "Reset the board" in capsys.readouterr().out
+
+def test_reset_during_write():
+    with connected_tool() as (emulator, tool):
+        reset = threading.Timer(0.3, emulator.inject_reset)
+        reset.start()
+        result = tool.run_write("lost", card_timeout=5)
+        assert result['status'] == 'reset'
+        # The host reacts to the first boot line; let the reboot finish
+        reset.join()
+        assert_next_card_is_read(emulator)
+
+def test_data_mismatch_cancels_write():
+    with connected_tool(garble_rate=1.0) as (emulator, tool):
+        result = tool.run_write("garbled")
+        assert result['status'] == 'data_mismatch'
+        assert_next_card_is_read(emulator)
+
+def test_batch_retry_after_mismatch():
+    with connected_tool(garble_rate=1.0) as (emulator, tool):
+        assert tool.start_batch_session()
+        assert tool.run_write("right", batch=True)['status'] == 'data_mismatch'
+        # The session stays open and takes the payload again
+        assert emulator.mode == BATCH_WRITE_MODE
+        assert emulator.data_to_write is None
+        emulator.garble_rate = 0.0
+        threading.Timer(0.3, emulator.present_card, args=(UID,)).start()
+        assert tool.run_write("right", batch=True, card_timeout=5)['status'] == 'success'
+        assert emulator.read_payload(UID) == "right"
+
+def test_command_word_payloads():
+    # Payloads the firmware would take for a command or trim reach the card intact
+    with connected_tool(auto_present=0.05) as (emulator, tool):
+        for payload in ("PING", "END_BATCH", "HOLDOFF 5", " padded "):
+            assert tool.run_write(payload, card_timeout=2)['status'] == 'success'
+            uid = next(reversed(emulator.cards))
+            assert emulator.read_payload(uid) == payload
+        assert emulator.holdoff == 0
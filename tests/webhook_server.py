@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Stand-in HTTP endpoint for the monitor's --webhook sink
+Accepts POSTed JSON arrays of card events, counts them, and can simulate an
+ingestion service that is slow, flaky or down for a while, so batching,
+retries and the on-disk spool can be exercised without the real service.
+
+Usage:
+    python tests/webhook_server.py --port 8080
+    python tests/webhook_server.py --port 8080 --fail-rate 0.2 --down-after 100 --down-for 10
+    python rfidvault.py --port /tmp/ttyRFID monitor --webhook http://127.0.0.1:8080/events
+"""
+
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class WebhookState:
+    """What the stand-in has received and when it should misbehave"""
+
+    def __init__(self, fail_rate=0.0, delay=0.0, down_after=0, down_for=0.0, seed=None):
+        self.fail_rate = fail_rate
+        self.delay = delay
+        self.down_after = down_after
+        self.down_for = down_for
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.events = 0
+        self.failures = 0
+        self.uids = []
+        self.down_until = None
+
+    def is_down(self):
+        """True while a simulated outage is in progress"""
+        with self.lock:
+            if self.down_until is None and self.down_after and self.events >= self.down_after:
+                self.down_until = time.monotonic() + self.down_for
+            return self.down_until is not None and time.monotonic() < self.down_until
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real service
+
+    def setup(self):
+        super().setup()
+        with self.server.state.lock:
+            self.server.connections.add(self.connection)
+
+    def finish(self):
+        with self.server.state.lock:
+            self.server.connections.discard(self.connection)
+        super().finish()
+
+    def do_POST(self):
+        state = self.server.state
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if state.delay:
+            time.sleep(state.delay)
+        if state.is_down() or state.random.random() < state.fail_rate:
+            with state.lock:
+                state.failures += 1
+            self.reply(503, b'{"ok": false}')
+            return
+        events = json.loads(body)
+        with state.lock:
+            state.requests += 1
+            state.events += len(events)
+            state.uids.extend(event.get('uid') for event in events)
+        self.reply(200, b'{"ok": true}')
+
+    def reply(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_server(state, host='127.0.0.1', port=0):
+    """Serve the stand-in from a background thread; port 0 picks a free one"""
+    server = ThreadingHTTPServer((host, port), WebhookHandler)
+    server.daemon_threads = True
+    server.state = state
+    server.connections = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def stop_server(server):
+    """Stop serving and drop open keep-alive connections, as if the process had exited"""
+    server.shutdown()
+    server.server_close()
+    with server.state.lock:
+        connections = list(server.connections)
+    for connection in connections:
+        try:
+            connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in webhook endpoint for rfidvault.py')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    parser.add_argument('--delay', type=float, default=0.0, help='Seconds to wait before answering')
+    parser.add_argument('--down-after', type=int, default=0, help='Start an outage after this many events')
+    parser.add_argument('--down-for', type=float, default=0.0, help='Length of the outage in seconds')
+    parser.add_argument('--seed', type=int, help='Random seed for reproducible runs')
+    args = parser.parse_args()
+
+    state = WebhookState(args.fail_rate, args.delay, args.down_after, args.down_for, args.seed)
+    server = start_server(state, args.host, args.port)
+    print(f"Webhook stand-in listening on http://{args.host}:{server.server_address[1]}/")
+    sys.stdout.flush()
+    try:
+        while True:
+            time.sleep(5)
+            print(f"requests={state.requests} events={state.events} failures={state.failures}")
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Received {state.events} events in {state.requests} requests ({state.failures} failures)")
+        stop_server(server)
+
+if __name__ == "__main__":
+    main()